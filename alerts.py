@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import os
+import threading
+from sortedcontainers import SortedList
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from background import start_background_task
+from database import (
+    get_user,
+    create_currency_alert,
+    get_active_currency_alerts,
+    deactivate_currency_alerts
+)
+from rates import cross_rate, get_cached_rates
+
+logger = logging.getLogger(__name__)
+
+ALERT_CHECK_INTERVAL = int(os.getenv('ALERT_CHECK_INTERVAL', '600'))
+ALERTS_BASE_CURRENCY = os.getenv('ALERTS_BASE_CURRENCY', 'USD')
+ALERT_NOTIFICATIONS_PER_SECOND = float(os.getenv('ALERT_NOTIFICATIONS_PER_SECOND', '20'))
+MAX_ALERTS_PER_USER = 20
+DIRECTIONS = {">": "выше", "<": "ниже"}
+
+
+class AlertIndex:
+    """Active alerts kept per currency pair in lists sorted by threshold.
+
+    For "rate > X" alerts the crossed ones are a prefix of the list, for
+    "rate < X" a suffix, so a new rate finds them with one bisect: O(log n + k).
+    """
+
+    def __init__(self):
+        self._above = {}
+        self._below = {}
+        self._alerts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, alert) -> None:
+        pair = (alert.from_currency, alert.to_currency)
+        index = self._above if alert.direction == ">" else self._below
+        with self._lock:
+            index.setdefault(pair, SortedList()).add((alert.threshold, alert.id))
+            self._alerts[alert.id] = alert
+
+    def remove(self, alert_id: int) -> None:
+        with self._lock:
+            alert = self._alerts.pop(alert_id, None)
+            if alert is None:
+                return
+            index = self._above if alert.direction == ">" else self._below
+            index[(alert.from_currency, alert.to_currency)].discard((alert.threshold, alert.id))
+
+    def pairs(self):
+        with self._lock:
+            return {pair for index in (self._above, self._below) for pair, alerts in index.items() if alerts}
+
+    def pop_crossed(self, pair, rate: float):
+        with self._lock:
+            crossed = []
+            above = self._above.get(pair)
+            if above:
+                end = above.bisect_left((rate,))
+                crossed.extend(above[:end])
+                del above[:end]
+            below = self._below.get(pair)
+            if below:
+                start = below.bisect_right((rate, float('inf')))
+                crossed.extend(below[start:])
+                del below[start:]
+            return [self._alerts.pop(alert_id) for _, alert_id in crossed]
+
+
+alert_index = None
+_notifications = None
+_loop = None
+
+
+def is_crossed(direction: str, rate: float, threshold: float) -> bool:
+    return rate > threshold if direction == ">" else rate < threshold
+
+
+async def on_rates_updated(base: str, rates: dict) -> None:
+    """Fire every alert crossed by a fresh set of rates for `base`."""
+    if alert_index is None or not len(alert_index):
+        return
+
+    triggered = []
+    for pair in alert_index.pairs():
+        rate = cross_rate(base, rates, *pair)
+        if rate is not None:
+            triggered.extend((alert, rate) for alert in alert_index.pop_crossed(pair, rate))
+    if not triggered:
+        return
+
+    try:
+        await asyncio.to_thread(deactivate_currency_alerts, [alert.id for alert, _ in triggered])
+    except Exception:
+        # В базе уведомления остались активными: возвращаем их в индекс,
+        # чтобы их проверило следующее обновление курса.
+        for alert, _ in triggered:
+            alert_index.add(alert)
+        raise
+
+    by_chat = {}
+    for alert, rate in triggered:
+        by_chat.setdefault(alert.chat_id, []).append(
+            f"• 1 {alert.from_currency} = {rate:.4f} {alert.to_currency} "
+            f"({DIRECTIONS[alert.direction]} {alert.threshold:g})"
+        )
+    for chat_id, lines in by_chat.items():
+        _notifications.put_nowait((chat_id, "🔔 Курс достиг заданного значения:\n\n" + "\n".join(lines)))
+    logger.info(f"Сработало уведомлений о курсе: {len(triggered)}")
+
+
+def notify_rates_updated(base: str, rates: dict) -> None:
+    """Run on_rates_updated on the bot's loop; safe to call from any thread."""
+    if _loop is None:
+        return
+    future = asyncio.run_coroutine_threadsafe(on_rates_updated(base, rates), _loop)
+    future.add_done_callback(_log_check_error)
+
+
+def _log_check_error(future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Ошибка при проверке уведомлений о курсе: {future.exception()}")
+
+
+async def _refresh_rates_loop() -> None:
+    while True:
+        await asyncio.sleep(ALERT_CHECK_INTERVAL)
+        if not len(alert_index):
+            continue
+        from currency import fetch_rates
+        try:
+            await fetch_rates(ALERTS_BASE_CURRENCY)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении курсов для уведомлений: {e}")
+
+
+async def _send_notifications_loop(bot, shards: int) -> None:
+    # Лимит Telegram общий для бота: каждый шард берёт свою долю.
+    delay = shards / ALERT_NOTIFICATIONS_PER_SECOND
+    while True:
+        chat_id, text = await _notifications.get()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except TelegramError as e:
+            logger.error(f"Не удалось отправить уведомление о курсе в чат {chat_id}: {e}")
+        await asyncio.sleep(delay)
+
+
+async def start_alerts(application, shard: int = 0, shards: int = 1) -> None:
+    global alert_index, _notifications, _loop
+    index = AlertIndex()
+    for alert in await asyncio.to_thread(get_active_currency_alerts, None, shard, shards):
+        index.add(alert)
+    alert_index = index
+    _notifications = asyncio.Queue()
+    _loop = asyncio.get_running_loop()
+    logger.info(f"Загружено активных уведомлений о курсе: {len(index)}")
+
+    start_background_task(_refresh_rates_loop(), "alerts-refresh")
+    start_background_task(_send_notifications_loop(application.bot, shards), "alerts-send")
+
+
+async def handle_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        args = context.args or []
+        if not args:
+            await show_alerts(update, context, user)
+            return
+
+        if len(args) != 4 or args[2] not in DIRECTIONS:
+            await update.message.reply_text(
+                "❌ Неправильный формат команды.\n"
+                "Используйте: /alert <из валюты> <в валюту> > <курс>\n"
+                "или: /alert <из валюты> <в валюту> < <курс>\n"
+                "Пример: /alert USD RUB > 95\n\n"
+                "Чтобы посмотреть свои уведомления, отправь /alert"
+            )
+            return
+
+        from_currency, to_currency, direction = args[0].upper(), args[1].upper(), args[2]
+        try:
+            threshold = float(args[3].replace(',', '.'))
+        except ValueError:
+            await update.message.reply_text("❌ Курс должен быть числом")
+            return
+
+        if len(get_active_currency_alerts(user.id)) >= MAX_ALERTS_PER_USER:
+            await update.message.reply_text(f"❌ Можно создать не больше {MAX_ALERTS_PER_USER} уведомлений")
+            return
+
+        current_rate = None
+        for base in (from_currency, ALERTS_BASE_CURRENCY):
+            cached = get_cached_rates(base, max_age=None)
+            if cached is not None:
+                current_rate = cross_rate(base, cached.rates, from_currency, to_currency)
+                break
+        if current_rate is not None and is_crossed(direction, current_rate, threshold):
+            await update.message.reply_text(
+                f"✅ Курс уже {DIRECTIONS[direction]} {threshold:g}: "
+                f"1 {from_currency} = {current_rate:.4f} {to_currency}"
+            )
+            return
+
+        alert = create_currency_alert(user.id, update.effective_user.id, from_currency, to_currency, direction, threshold)
+        if alert_index is not None:
+            alert_index.add(alert)
+
+        message = (
+            f"🔔 Уведомление создано!\n\n"
+            f"Сообщу, когда курс 1 {from_currency} станет {DIRECTIONS[direction]} {threshold:g} {to_currency}"
+        )
+        if current_rate is not None:
+            message += f"\nТекущий курс: {current_rate:.4f}"
+        await update.message.reply_text(message)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_alert: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def show_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    alerts = get_active_currency_alerts(user.id)
+    if not alerts:
+        message = (
+            "🔔 У тебя нет активных уведомлений о курсе.\n\n"
+            "Создай новое командой:\n"
+            "/alert USD RUB > 95"
+        )
+    else:
+        message = "🔔 Твои уведомления о курсе:\n\n"
+        for alert in alerts:
+            message += (
+                f"• 1 {alert.from_currency} {alert.direction} {alert.threshold:g} {alert.to_currency}\n"
+            )
+    keyboard = [
+        [InlineKeyboardButton(
+            f"❌ {alert.from_currency}/{alert.to_currency} {alert.direction} {alert.threshold:g}",
+            callback_data=f"alert_delete_{alert.id}"
+        )]
+        for alert in alerts
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+
+    if update.callback_query:
+        await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(message, reply_markup=reply_markup)
+
+
+async def handle_alert_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    alert_id = int(update.callback_query.data.split("_")[2])
+    if deactivate_currency_alerts([alert_id], user.id) and alert_index is not None:
+        alert_index.remove(alert_id)
+    await show_alerts(update, context, user)
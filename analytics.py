@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import zlib
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from telegram import Update
+from telegram.ext import ContextTypes
+from admin import is_admin
+from background import start_background_task
+from cache import TTLCache
+from database import get_usage_rollups, save_usage_rollups
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_TIMEZONE = ZoneInfo(os.getenv('ANALYTICS_TIMEZONE', 'Europe/Moscow'))
+ANALYTICS_FLUSH_INTERVAL = int(os.getenv('ANALYTICS_FLUSH_INTERVAL', '60'))
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_HASH_BITS = 64 - HLL_PRECISION
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(HLL_HASH_BITS + 2)]
+
+FEATURES = {
+    "all": "👥 Все пользователи",
+    "notes": "📝 Заметки",
+    "goals": "🎯 Цели",
+    "weather": "🌤 Погода",
+    "currency": "💱 Валюта",
+    "games": "🎮 Игры"
+}
+COMMAND_FEATURES = {
+    "notes": "notes",
+    "goals": "goals",
+    "weather": "weather",
+    "digest": "weather",
+    "currency": "currency",
+    "convert": "currency",
+    "rates_history": "currency",
+    "alert": "currency",
+    "guess": "games",
+    "rps": "games",
+    "quiz": "games",
+    "top": "games"
+}
+BUTTON_FEATURES = {
+    "📝 Заметки": "notes",
+    "🎯 Цели": "goals",
+    "🌤 Погода": "weather",
+    "💱 Валюта": "currency",
+    "🎮 Игры": "games"
+}
+CALLBACK_FEATURES = (
+    ("notes", "notes"), ("create_note", "notes"), ("list_notes", "notes"),
+    ("add_image_", "notes"), ("show_image_", "notes"), ("delete_note_", "notes"),
+    ("edit_note_", "notes"), ("note_", "notes"), ("tag", "notes"), ("folder", "notes"),
+    ("move_note_", "notes"), ("new_folder_", "notes"), ("bulk_notes_", "notes"), ("archive_notes", "notes"),
+    ("undo_notes_", "notes"), ("bulk_goals_", "goals"), ("archive_goals", "goals"), ("undo_goals_", "goals"),
+    ("goals", "goals"), ("create_goal", "goals"), ("list_goals", "goals"), ("delete_goal_", "goals"),
+    ("weather", "weather"),
+    ("currency", "currency"), ("alert_", "currency"),
+    ("games_menu", "games"), ("game_", "games"), ("rps_", "games"), ("quiz_", "games"), ("top_", "games")
+)
+
+
+class HyperLogLog:
+    """Estimates the number of distinct ids in 4 KB with about 1.6% error.
+
+    Sketches of different days or shards merge into the sketch of their
+    union by taking the maximum of each register.
+    """
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(HLL_REGISTERS)
+
+    def add(self, value: int) -> None:
+        digest = hashlib.blake2b(value.to_bytes(8, 'big', signed=True), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> HLL_HASH_BITS
+        rank = HLL_HASH_BITS - (hashed & ((1 << HLL_HASH_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        estimate = 0.7213 / (1 + 1.079 / HLL_REGISTERS) * HLL_REGISTERS ** 2 / sum(
+            _INVERSE_POWERS[rank] for rank in self.registers
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            return round(HLL_REGISTERS * math.log(HLL_REGISTERS / zeros))
+        return round(estimate)
+
+    def pack(self) -> bytes:
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def unpack(cls, payload: bytes) -> "HyperLogLog":
+        return cls(zlib.decompress(payload))
+
+
+class UsageCounter:
+    __slots__ = ('sketch', 'events')
+
+    def __init__(self, sketch=None, events=0):
+        self.sketch = sketch or HyperLogLog()
+        self.events = events
+
+
+_usage = {}
+_dirty = set()
+_shard = 0
+_reports = TTLCache(1, ANALYTICS_FLUSH_INTERVAL)
+
+
+def today():
+    return datetime.now(ANALYTICS_TIMEZONE).date()
+
+
+def feature_of(update: Update):
+    if update.callback_query and update.callback_query.data:
+        data = update.callback_query.data
+        for prefix, feature in CALLBACK_FEATURES:
+            if data.startswith(prefix):
+                return feature
+        return None
+    if update.inline_query:
+        return "currency"
+    message = update.message
+    if message is None:
+        return None
+    if message.location:
+        return "weather"
+    if message.photo:
+        return "notes"
+    text = message.text or ""
+    if text.startswith('/') and len(text) > 1:
+        command = text[1:].split(maxsplit=1)[0].split('@')[0].lower()
+        return COMMAND_FEATURES.get(command)
+    return BUTTON_FEATURES.get(text)
+
+
+def record_usage(user_id: int, feature: str, day) -> None:
+    for key in ((day, "all"), (day, feature)) if feature else ((day, "all"),):
+        counter = _usage.get(key)
+        if counter is None:
+            counter = _usage[key] = UsageCounter()
+        counter.sketch.add(user_id)
+        counter.events += 1
+        _dirty.add(key)
+
+
+async def track_usage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user is None:
+        return
+    record_usage(update.effective_user.id, feature_of(update), today())
+
+
+def load_usage(shard: int) -> None:
+    """Restore this shard's counters for today and yesterday, so flushes keep adding to them."""
+    current = today()
+    for day, feature, events, sketch in get_usage_rollups(current - timedelta(days=1), current, shard):
+        _usage[(day, feature)] = UsageCounter(HyperLogLog.unpack(sketch), events)
+
+
+def _take_snapshot():
+    """Copy the counters changed since the last flush; runs on the event loop."""
+    snapshot = [
+        (day, feature, _usage[(day, feature)].events, HyperLogLog(_usage[(day, feature)].sketch.registers))
+        for day, feature in _dirty
+    ]
+    _dirty.clear()
+    return snapshot
+
+
+def _save_usage(shard: int, snapshot) -> None:
+    save_usage_rollups(shard, [
+        (day, feature, events, sketch.pack())
+        for day, feature, events, sketch in snapshot
+    ])
+
+
+async def flush_usage() -> None:
+    if not _dirty:
+        return
+    await asyncio.to_thread(_save_usage, _shard, _take_snapshot())
+
+    yesterday = today() - timedelta(days=1)
+    for key in [key for key in _usage if key[0] < yesterday]:
+        del _usage[key]
+
+
+async def _flush_loop() -> None:
+    try:
+        while True:
+            await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+            try:
+                await flush_usage()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении статистики использования: {e}")
+    finally:
+        if _dirty:
+            _save_usage(_shard, _take_snapshot())
+
+
+async def start_analytics(application, shard: int = 0, shards: int = 1) -> None:
+    global _shard
+    _shard = shard
+    await asyncio.to_thread(load_usage, shard)
+    start_background_task(_flush_loop(), "analytics-flush")
+
+
+def build_report(current) -> str:
+    """Merge the daily sketches of every shard into day, week and month figures."""
+    periods = {"day": current, "week": current - timedelta(days=6), "month": current - timedelta(days=29)}
+    merged = {(feature, period): HyperLogLog() for feature in FEATURES for period in periods}
+    events = dict.fromkeys(FEATURES, 0)
+
+    for day, feature, day_events, payload in get_usage_rollups(periods["month"], current):
+        if feature not in FEATURES:
+            continue
+        sketch = HyperLogLog.unpack(payload)
+        for period, start in periods.items():
+            if day >= start:
+                merged[(feature, period)].merge(sketch)
+        if day == current:
+            events[feature] += day_events
+
+    lines = [f"📈 Аналитика на {current.strftime('%d.%m.%Y')}", "Уникальные пользователи: день / 7 дней / 30 дней", ""]
+    for feature, title in FEATURES.items():
+        day, week, month = (merged[(feature, period)].count() for period in periods)
+        lines.append(f"{title}: {day} / {week} / {month} (действий сегодня: {events[feature]})")
+    return "\n".join(lines)
+
+
+async def handle_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        if not is_admin(update):
+            await update.message.reply_text("❌ Команда доступна только администраторам.")
+            return
+
+        current = today()
+        report = _reports.get(current)
+        if report is None:
+            await flush_usage()
+            report = await asyncio.to_thread(build_report, current)
+            _reports.set(current, report)
+        await update.message.reply_text(report)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_analytics: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
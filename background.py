@@ -0,0 +1,30 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tasks = set()
+
+
+async def _run_guarded(coro, name: str) -> None:
+    try:
+        await coro
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Фоновая задача {name} завершилась с ошибкой: {e}")
+
+
+def start_background_task(coro, name: str) -> asyncio.Task:
+    """Run a long-lived coroutine until stop_background_tasks() is called."""
+    task = asyncio.create_task(_run_guarded(coro, name), name=name)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def stop_background_tasks() -> None:
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
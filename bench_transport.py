@@ -0,0 +1,116 @@
+"""Measure Bot API send throughput for different transport settings.
+
+    python bench_transport.py [--messages 500] [--latency 0.05] [--pools 1,8,64,256]
+
+A local stub of the Bot API answers every request after --latency seconds,
+standing in for the round trip to api.telegram.org. For each pool size the
+script sends --messages sendMessage calls at once, while a getUpdates long
+poll is held open the way the updater holds it, and prints messages per
+second. Pass --url to run against a real Bot API server instead (a local
+telegram-bot-api instance, for example) together with --token and --chat-id.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from telegram import Bot
+from transport import build_request, BOT_HTTP_VERSION
+
+TOKEN = "123:bench"
+
+
+async def _serve_connection(reader, writer, latency: float) -> None:
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            path = lines[0].split(" ")[1]
+            headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+            await reader.readexactly(int(headers.get("Content-Length", headers.get("content-length", 0))))
+            if path.endswith("/getUpdates"):
+                await asyncio.sleep(10)
+                result = []
+            elif path.endswith("/getMe"):
+                result = {"id": 123, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+            else:
+                await asyncio.sleep(latency)
+                result = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1, "type": "private"},
+                          "text": "ok"}
+            body = json.dumps({"ok": True, "result": result}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(latency: float, ports) -> None:
+    async def serve():
+        server = await asyncio.start_server(
+            lambda reader, writer: _serve_connection(reader, writer, latency), "127.0.0.1", 0
+        )
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+async def run_case(base_url: str, token: str, chat_id: int, pool_size: int, messages: int) -> float:
+    bot = Bot(
+        token,
+        base_url=base_url,
+        request=build_request(pool_size=pool_size),
+        get_updates_request=build_request(get_updates=True)
+    )
+    async with bot:
+        poll = asyncio.create_task(bot.get_updates(timeout=10, read_timeout=15))
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(bot.send_message(chat_id, f"bench {number}", pool_timeout=60) for number in range(messages)),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+        poll.cancel()
+        await asyncio.gather(poll, return_exceptions=True)
+        errors = sum(isinstance(result, Exception) for result in results)
+    if errors:
+        print(f"    ошибок: {errors}")
+    return (messages - errors) / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнить пропускную способность настроек транспорта")
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--pools', default="1,8,64,256")
+    parser.add_argument('--url')
+    parser.add_argument('--token', default=TOKEN)
+    parser.add_argument('--chat-id', type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        # Заглушка работает в отдельном процессе, чтобы не отнимать процессор у клиента.
+        ports = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_serve, args=(args.latency, ports), daemon=True)
+        server.start()
+        base_url = f"http://127.0.0.1:{ports.get(timeout=10)}/bot"
+
+    print(f"HTTP/{BOT_HTTP_VERSION}, сообщений: {args.messages}, задержка сервера: {args.latency * 1000:.0f} мс")
+    for pool_size in (int(pool) for pool in args.pools.split(",")):
+        rate = await run_case(base_url, args.token, args.chat_id, pool_size, args.messages)
+        print(f"пул {pool_size:>4}: {rate:8.0f} сообщений/с")
+
+    if server is not None:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,43 +1,30 @@
 import os
+import asyncio
+import importlib
 import logging
-import random
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     ContextTypes,
+    TypeHandler,
     filters
 )
 from dotenv import load_dotenv
-from database import init_db, create_user, get_user
-from handlers import (
-    handle_start,
-    handle_notes,
-    handle_goals,
-    handle_weather,
-    handle_currency,
-    handle_stats,
-    handle_image,
-    button_callback,
-    handle_text,
-    handle_cancel,
-    handle_convert,
-    handle_guess_number,
-    handle_rps,
-    handle_quiz
-)
 
-load_dotenv()
+# Остальные модули импортируются там, где нужны, чтобы не задерживать запуск.
+STARTED_AT = time.monotonic()
 
+load_dotenv()
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+first_update_seen = False
+
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error("Exception while handling an update:", exc_info=context.error)
@@ -47,10 +34,83 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
 
 
+def lazy_handler(module_name: str, function_name: str):
+    """Import the feature module on first use instead of at startup."""
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        module = importlib.import_module(module_name)
+        await getattr(module, function_name)(update, context)
+
+    handler.__name__ = function_name
+    return handler
+
+
+async def record_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global first_update_seen
+    if not first_update_seen:
+        first_update_seen = True
+        logger.info("Первое обновление получено через %.2f с после запуска", time.monotonic() - STARTED_AT)
+
+
+def prepare_storage() -> None:
+    # Основные обработчики и модели SQLAlchemy импортируются в отдельном потоке,
+    # пока в основном цикле регистрируются команды бота.
+    importlib.import_module('handlers')
+    from database import init_db
+    from rates import load_rate_cache
+    init_db()
+    load_rate_cache()
+
+
+async def post_init(application: Application) -> None:
+    from dedupe import load_processed_updates
+    load_processed_updates()
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        loop.run_in_executor(None, prepare_storage),
+        application.bot.set_my_commands(COMMANDS)
+    )
+    await start_services(application)
+    now = time.monotonic()
+    logger.info(
+        "База данных и команды готовы за %.2f с, с момента запуска прошло %.2f с",
+        now - started, now - STARTED_AT
+    )
+
+
+async def start_services(application: Application, shard: int = 0, shards: int = 1) -> None:
+    from alerts import start_alerts
+    from digest import start_digest
+    from broadcast import start_broadcasts
+    from retention import start_retention
+    from analytics import start_analytics
+    from invalidation import start_invalidation
+    from trash import start_purge
+    await start_invalidation(application, shard, shards)
+    await start_alerts(application, shard, shards)
+    await start_digest(application, shard, shards)
+    await start_broadcasts(application, shard, shards)
+    await start_retention(application, shard, shards)
+    await start_analytics(application, shard, shards)
+    await start_purge(application, shard, shards)
+
+
+async def post_stop(application: Application) -> None:
+    from background import stop_background_tasks
+    await stop_background_tasks()
+
+
+async def post_shutdown(application: Application) -> None:
+    from dedupe import save_processed_updates
+    save_processed_updates()
+
+
 async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    from database import create_user, get_user, clear_delivery_failure
+
     try:
         user = update.effective_user
-        logger.info(f"Пользователь {user.username} начал работу с ботом")
+        logger.info("Пользователь %s начал работу с ботом", user.username)
 
         db_user = get_user(user.id)
 
@@ -61,7 +121,9 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 first_name=user.first_name,
                 last_name=user.last_name
             )
-            logger.info(f"Создан новый пользователь: {user.username}")
+            logger.info("Создан новый пользователь: %s", user.username)
+        else:
+            clear_delivery_failure(db_user.id)
 
         keyboard = [
             [KeyboardButton("📝 Заметки"), KeyboardButton("🎯 Цели")],
@@ -91,55 +153,92 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
 
 
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+COMMANDS = [
+    ("start", "Начать работу с ботом"),
+    ("notes", "Управление заметками"),
+    ("goals", "Управление целями"),
+    ("weather", "Узнать погоду"),
+    ("digest", "Ежедневная сводка погоды"),
+    ("currency", "Курсы валют"),
+    ("convert", "Конвертация валют"),
+    ("rates_history", "История курса валют"),
+    ("alert", "Уведомления о курсе валют"),
+    ("stats", "Статистика"),
+    ("guess", "Игра 'Угадай число'"),
+    ("rps", "Игра 'Камень-ножницы-бумага'"),
+    ("quiz", "Викторина"),
+    ("top", "Рейтинг игроков"),
+    ("cancel", "Отменить текущее действие")
+]
+
+
+def build_application(token: str, builder=None) -> Application:
+    from logs import BoundUpdateProcessor
+    from transport import apply_transport
+    if builder is None:
+        builder = Application.builder()
+    builder = apply_transport(builder)
+    application = builder.token(token).base_url(TELEGRAM_API_URL).concurrent_updates(BoundUpdateProcessor(1)).post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
+
+    logger.info("Добавление обработчиков команд...")
+    application.add_handler(TypeHandler(Update, lazy_handler("dedupe", "skip_duplicate_update")), group=-3)
+    application.add_handler(TypeHandler(Update, record_first_update), group=-2)
+    application.add_handler(TypeHandler(Update, lazy_handler("throttle", "throttle_update")), group=-1)
+
+    application.add_handler(CommandHandler("start", handle_start))
+    application.add_handler(CommandHandler("notes", lazy_handler("handlers", "handle_notes")))
+    application.add_handler(CommandHandler("goals", lazy_handler("handlers", "handle_goals")))
+    application.add_handler(CommandHandler("weather", lazy_handler("weather", "handle_weather")))
+    application.add_handler(CommandHandler("digest", lazy_handler("digest", "handle_digest")))
+    application.add_handler(CommandHandler("broadcast", lazy_handler("broadcast", "handle_broadcast")))
+    application.add_handler(CommandHandler("analytics", lazy_handler("analytics", "handle_analytics")))
+    application.add_handler(CommandHandler("profile", lazy_handler("profiler", "handle_profile")))
+    application.add_handler(CommandHandler("currency", lazy_handler("currency", "handle_currency")))
+    application.add_handler(CommandHandler("convert", lazy_handler("currency", "handle_convert")))
+    application.add_handler(CommandHandler("rates_history", lazy_handler("currency", "handle_rates_history")))
+    application.add_handler(CommandHandler("alert", lazy_handler("alerts", "handle_alert")))
+    application.add_handler(CommandHandler("stats", lazy_handler("handlers", "handle_stats")))
+    application.add_handler(CommandHandler("cancel", lazy_handler("handlers", "handle_cancel")))
+
+    application.add_handler(CommandHandler("guess", lazy_handler("games", "handle_guess_number")))
+    application.add_handler(CommandHandler("rps", lazy_handler("games", "handle_rps")))
+    application.add_handler(CommandHandler("quiz", lazy_handler("quiz", "handle_quiz")))
+    application.add_handler(CommandHandler("top", lazy_handler("leaderboard", "handle_top")))
+
+    application.add_handler(MessageHandler(filters.PHOTO, lazy_handler("handlers", "handle_image")))
+    application.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.LOCATION, lazy_handler("weather", "handle_location")))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, lazy_handler("handlers", "handle_text")))
+
+    application.add_handler(CallbackQueryHandler(lazy_handler("handlers", "button_callback")))
+    application.add_handler(InlineQueryHandler(lazy_handler("inline", "handle_inline_query"), block=False))
+    application.add_handler(TypeHandler(Update, lazy_handler("analytics", "track_usage")), group=1)
+
+    application.add_error_handler(error_handler)
+    return application
+
+
 def main() -> None:
+    from logs import setup_logging
+    setup_logging()
     try:
-        logger.info("Инициализация базы данных...")
-        init_db()
-        logger.info("База данных успешно инициализирована")
-
         token = os.getenv('TELEGRAM_TOKEN')
         if not token:
             logger.error("TELEGRAM_TOKEN не найден в переменных окружения")
             raise ValueError("TELEGRAM_TOKEN не найден в переменных окружения")
-        
+
+        shards = int(os.getenv('BOT_SHARDS', '1'))
+        if shards > 1:
+            from database import init_db
+            from sharding import ShardSupervisor
+            init_db()
+            logger.info("Запуск в режиме шардирования: %s процессов", shards)
+            ShardSupervisor(token, shards).run()
+            return
+
         logger.info("Создание приложения...")
-        application = Application.builder().token(token).build()
-
-        logger.info("Добавление обработчиков команд...")
-        application.add_handler(CommandHandler("start", handle_start))
-        application.add_handler(CommandHandler("notes", handle_notes))
-        application.add_handler(CommandHandler("goals", handle_goals))
-        application.add_handler(CommandHandler("weather", handle_weather))
-        application.add_handler(CommandHandler("currency", handle_currency))
-        application.add_handler(CommandHandler("convert", handle_convert))
-        application.add_handler(CommandHandler("stats", handle_stats))
-        application.add_handler(CommandHandler("cancel", handle_cancel))
-        
-        application.add_handler(CommandHandler("guess", handle_guess_number))
-        application.add_handler(CommandHandler("rps", handle_rps))
-        application.add_handler(CommandHandler("quiz", handle_quiz))
-        
-        application.add_handler(MessageHandler(filters.PHOTO, handle_image))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-        
-        application.add_handler(CallbackQueryHandler(button_callback))
-        
-        application.add_error_handler(error_handler)
-
-        commands = [
-            ("start", "Начать работу с ботом"),
-            ("notes", "Управление заметками"),
-            ("goals", "Управление целями"),
-            ("weather", "Узнать погоду"),
-            ("currency", "Курсы валют"),
-            ("convert", "Конвертация валют"),
-            ("stats", "Статистика"),
-            ("guess", "Игра 'Угадай число'"),
-            ("rps", "Игра 'Камень-ножницы-бумага'"),
-            ("quiz", "Викторина"),
-            ("cancel", "Отменить текущее действие")
-        ]
-        application.bot.set_my_commands(commands)
+        application = build_application(token)
 
         logger.info("Бот запущен и готов к работе!")
         application.run_polling(allowed_updates=Update.ALL_TYPES)
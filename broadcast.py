@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+from telegram import Bot, Update
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.ext import ContextTypes
+from admin import is_admin
+from background import start_background_task
+from transport import build_request
+from database import (
+    create_broadcast,
+    get_broadcast,
+    get_broadcast_recipients,
+    checkpoint_broadcast,
+    cancel_broadcast
+)
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '15'))
+BROADCAST_CHUNK = int(os.getenv('BROADCAST_CHUNK', '100'))
+BROADCAST_POLL_INTERVAL = 10
+STATUS_NAMES = {"running": "⏳ выполняется", "done": "✅ завершена", "cancelled": "🛑 отменена"}
+
+
+async def _deliver(bot: Bot, chat_id: int, text: str):
+    """Send one message; return None on success or (permanent, reason) on failure."""
+    while True:
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return None
+        except RetryAfter as e:
+            logger.info(f"Рассылка: превышен лимит Telegram, пауза {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+        except Forbidden as e:
+            return True, e.message
+        except BadRequest as e:
+            return "chat not found" in e.message.lower(), e.message
+        except TelegramError as e:
+            return False, str(e)
+
+
+async def run_broadcast(bot: Bot, broadcast) -> None:
+    """Send a broadcast to every reachable user, resuming from its saved cursor.
+
+    Users are read in primary-key order one chunk at a time, so memory does not
+    grow with the user base. Progress and permanent failures are saved after
+    every chunk; after a crash at most one chunk is sent again.
+    """
+    loop = asyncio.get_running_loop()
+    delay = 1 / BROADCAST_RATE
+    next_send = loop.time()
+    cursor = broadcast.last_user_id or 0
+    logger.info(f"Рассылка {broadcast.id}: старт с пользователя {cursor}")
+
+    while True:
+        recipients = await asyncio.to_thread(get_broadcast_recipients, cursor, BROADCAST_CHUNK)
+        if not recipients:
+            await asyncio.to_thread(checkpoint_broadcast, broadcast.id, cursor, 0, 0, [], 'done')
+            logger.info(f"Рассылка {broadcast.id} завершена")
+            return
+
+        sent = failed = 0
+        failures = []
+        for user_id, telegram_id in recipients:
+            await asyncio.sleep(max(0, next_send - loop.time()))
+            next_send = max(next_send, loop.time()) + delay
+
+            error = await _deliver(bot, telegram_id, broadcast.text)
+            if error is None:
+                sent += 1
+            else:
+                failed += 1
+                permanent, reason = error
+                if permanent:
+                    failures.append((user_id, reason))
+
+        cursor = recipients[-1].id
+        status = await asyncio.to_thread(checkpoint_broadcast, broadcast.id, cursor, sent, failed, failures)
+        if status != 'running':
+            logger.info(f"Рассылка {broadcast.id} остановлена: {status}")
+            return
+
+
+async def _broadcast_loop(bot: Bot) -> None:
+    async with bot:
+        while True:
+            try:
+                broadcast = await asyncio.to_thread(get_broadcast, None, 'running')
+                if broadcast is not None:
+                    await run_broadcast(bot, broadcast)
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка при рассылке: {e}")
+            await asyncio.sleep(BROADCAST_POLL_INTERVAL)
+
+
+async def start_broadcasts(application, shard: int = 0, shards: int = 1) -> None:
+    if shard != 0:
+        return
+    # Отдельный клиент со своим пулом соединений, чтобы рассылка не занимала
+    # соединения, через которые отвечают на сообщения пользователей.
+    bot = Bot(
+        application.bot.token,
+        base_url=application.bot.base_url.removesuffix(application.bot.token),
+        request=build_request(pool_size=2)
+    )
+    start_background_task(_broadcast_loop(bot), "broadcast")
+
+
+def format_broadcast_status(broadcast) -> str:
+    return (
+        f"📣 Рассылка #{broadcast.id}: {STATUS_NAMES.get(broadcast.status, broadcast.status)}\n"
+        f"✅ Отправлено: {broadcast.sent_count}\n"
+        f"❌ Ошибок: {broadcast.failed_count}\n"
+        f"📅 Создана: {broadcast.created_at.strftime('%d.%m.%Y %H:%M')}"
+    )
+
+
+async def handle_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        if not is_admin(update):
+            await update.message.reply_text("❌ Команда доступна только администраторам.")
+            return
+
+        args = context.args or []
+        if not args or args[0].lower() in ('status', 'статус'):
+            broadcast = get_broadcast()
+            message = format_broadcast_status(broadcast) if broadcast else "📣 Рассылок ещё не было."
+            await update.message.reply_text(
+                f"{message}\n\n"
+                "Новая рассылка: /broadcast <текст>\n"
+                "Отменить текущую: /broadcast cancel"
+            )
+            return
+
+        if len(args) == 1 and args[0].lower() in ('cancel', 'отмена'):
+            broadcast = get_broadcast(status='running')
+            if broadcast and cancel_broadcast(broadcast.id):
+                await update.message.reply_text(f"🛑 Рассылка #{broadcast.id} отменена.")
+            else:
+                await update.message.reply_text("❌ Нет активной рассылки.")
+            return
+
+        if get_broadcast(status='running'):
+            await update.message.reply_text("❌ Уже выполняется другая рассылка. Дождись её окончания или отмени.")
+            return
+
+        text = update.message.text.split(maxsplit=1)[1]
+        broadcast_id = create_broadcast(text, update.effective_user.id)
+        await update.message.reply_text(
+            f"📣 Рассылка #{broadcast_id} поставлена в очередь.\n"
+            "Прогресс: /broadcast status"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в handle_broadcast: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
@@ -0,0 +1,142 @@
+import logging
+from datetime import datetime
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database import (
+    get_selectable_items,
+    count_archived,
+    delete_notes,
+    delete_goals,
+    set_notes_archived,
+    set_goals_archived
+)
+from trash import undo_markup, UNDO_WINDOW
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+TITLES = {"notes": "заметки", "goals": "цели"}
+DELETE = {"notes": delete_notes, "goals": delete_goals}
+SET_ARCHIVED = {"notes": set_notes_archived, "goals": set_goals_archived}
+
+
+def _selection(context, kind: str) -> set:
+    return context.user_data.setdefault(f'selected_{kind}', set())
+
+
+def build_selector(kind: str, items, selected: set, page: int):
+    pages = max(1, -(-len(items) // PAGE_SIZE))
+    page = min(page, pages - 1)
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'✅' if item_id in selected else '▫️'} {label}",
+            callback_data=f"bulk_{kind}_t_{item_id}_{page}"
+        )]
+        for item_id, label in items[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️", callback_data=f"bulk_{kind}_p_{page - 1}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("➡️", callback_data=f"bulk_{kind}_p_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([
+        InlineKeyboardButton("☑️ Выбрать все", callback_data=f"bulk_{kind}_all"),
+        InlineKeyboardButton("🔲 Снять выбор", callback_data=f"bulk_{kind}_none")
+    ])
+    keyboard.append([
+        InlineKeyboardButton(f"🗑 Удалить ({len(selected)})", callback_data=f"bulk_{kind}_delete"),
+        InlineKeyboardButton(f"📦 В архив ({len(selected)})", callback_data=f"bulk_{kind}_archive")
+    ])
+    keyboard.append([InlineKeyboardButton("🧹 Удалить все", callback_data=f"bulk_{kind}_clear")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=kind)])
+    text = f"☑️ Выбери {TITLES[kind]} ({len(items)} всего, страница {page + 1} из {pages}):"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def handle_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    """Multi-select menu for notes and goals.
+
+    The selection lives in user_data and the menu is one message edited in
+    place. Every action on the selection is a single transaction of
+    set-based statements, however many items are selected.
+    """
+    query = update.callback_query
+    parts = query.data.split("_")
+    kind, action = parts[1], parts[2]
+    selected = _selection(context, kind)
+    page = 0
+    if action in ("delete", "archive") and not selected:
+        await query.answer("Ничего не выбрано")
+        return
+    await query.answer()
+
+    if action == "open":
+        selected.clear()
+    elif action == "t":
+        item_id, page = int(parts[3]), int(parts[4])
+        selected ^= {item_id}
+    elif action == "p":
+        page = int(parts[3])
+    elif action == "all":
+        selected.update(item_id for item_id, _ in get_selectable_items(kind, user.id))
+    elif action == "none":
+        selected.clear()
+    elif action in ("delete", "archive"):
+        if action == "delete":
+            deleted_at = datetime.utcnow()
+            changed = DELETE[kind](user.id, list(selected), deleted_at)
+            message = f"🗑 Удалено: {changed}"
+            reply_markup = undo_markup(kind, deleted_at, back=kind)
+        else:
+            changed = SET_ARCHIVED[kind](user.id, True, list(selected))
+            message = f"📦 Перенесено в архив: {changed}"
+            reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=kind)]])
+        selected.clear()
+        await query.message.edit_text(message, reply_markup=reply_markup)
+        return
+    elif action == "clear":
+        keyboard = [[
+            InlineKeyboardButton("✅ Да, удалить все", callback_data=f"bulk_{kind}_clearok"),
+            InlineKeyboardButton("❌ Отмена", callback_data=f"bulk_{kind}_open")
+        ]]
+        await query.message.edit_text(
+            f"⚠️ Удалить все {TITLES[kind]}, включая архив? Отменить можно в течение {UNDO_WINDOW // 60} мин.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+    elif action == "clearok":
+        deleted_at = datetime.utcnow()
+        changed = DELETE[kind](user.id, None, deleted_at)
+        selected.clear()
+        await query.message.edit_text(f"🧹 Удалено: {changed}", reply_markup=undo_markup(kind, deleted_at, back=kind))
+        return
+
+    items = get_selectable_items(kind, user.id)
+    if not items:
+        await query.message.edit_text(
+            f"☑️ Нет {'заметок' if kind == 'notes' else 'целей'} для выбора.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=kind)]])
+        )
+        return
+    text, reply_markup = build_selector(kind, items, selected, page)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+
+async def handle_archive(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    """Show how many items are archived and restore all of them on request."""
+    query = update.callback_query
+    parts = query.data.split("_")
+    kind = parts[1]
+    back = InlineKeyboardButton("🔙 Назад", callback_data=kind)
+
+    if len(parts) > 2 and parts[2] == "restore":
+        restored = SET_ARCHIVED[kind](user.id, False)
+        await query.message.edit_text(f"↩️ Восстановлено из архива: {restored}", reply_markup=InlineKeyboardMarkup([[back]]))
+        return
+
+    archived = count_archived(kind, user.id)
+    keyboard = [[InlineKeyboardButton("↩️ Вернуть все", callback_data=f"archive_{kind}_restore")]] if archived else []
+    keyboard.append([back])
+    await query.message.edit_text(f"📦 В архиве: {archived}", reply_markup=InlineKeyboardMarkup(keyboard))
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from alerts import on_rates_updated
+from database import get_user
+from rates import get_cached_rates, rate_history, rate_on, sparkline, store_rates
+from resilience import UpstreamResponse, UpstreamUnavailable, fetch_json_async
+
+logger = logging.getLogger(__name__)
+
+HISTORY_POINTS = 24
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d')
+
+
+def _cached_response(base_currency: str, cached, stale=False) -> UpstreamResponse:
+    data = {'base': base_currency, 'rates': cached.rates}
+    # fetched_at хранится как наивное время UTC; без tzinfo timestamp() счёл бы его местным.
+    fetched_at = cached.fetched_at.replace(tzinfo=timezone.utc).timestamp()
+    return UpstreamResponse(200, data, fetched_at, stale=stale)
+
+
+async def fetch_rates(base_currency: str) -> UpstreamResponse:
+    cached = get_cached_rates(base_currency)
+    if cached is not None:
+        return _cached_response(base_currency, cached)
+
+    url = f"https://api.exchangerate-api.com/v4/latest/{base_currency}"
+    try:
+        response = await fetch_json_async(url, f"rates:{base_currency}")
+    except UpstreamUnavailable:
+        cached = get_cached_rates(base_currency, max_age=None)
+        if cached is None:
+            raise
+        return _cached_response(base_currency, cached, stale=True)
+
+    if response.status_code == 200 and not response.stale:
+        await asyncio.to_thread(store_rates, base_currency, response.data)
+        await on_rates_updated(base_currency, response.data['rates'])
+    return response
+
+
+def parse_date(value: str):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+async def handle_currency(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        api_key = os.getenv('CURRENCY_API_KEY')
+        if not api_key:
+            logger.error("CURRENCY_API_KEY не найден в переменных окружения")
+            await update.message.reply_text("❌ Ошибка конфигурации. Пожалуйста, свяжитесь с администратором.")
+            return
+
+        base_currency = "RUB"
+        target_currencies = ["USD", "EUR", "GBP", "CNY"]
+        try:
+            response = await fetch_rates(base_currency)
+        except UpstreamUnavailable:
+            response = None
+        data = response.data if response else {}
+
+        if response is None or response.status_code != 200:
+            logger.error(f"Ошибка при получении курсов валют: {data.get('error', 'Сервис недоступен')}")
+            message = "❌ Не удалось получить курсы валют. Попробуйте позже."
+        else:
+            message = "💱 Курсы валют:\n\n"
+            for currency in target_currencies:
+                if currency in data['rates']:
+                    rate = data['rates'][currency]
+                    formatted_rate = f"{rate:.2f}"
+                    message += f"1 {base_currency} = {formatted_rate} {currency}\n"
+
+            message += "\n💡 Для конвертации валют используйте команду:\n"
+            message += "/convert <сумма> <из валюты> <в валюту>\n"
+            message += "Пример: /convert 100 USD RUB"
+            message += response.stale_note()
+
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_currency: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_convert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Convert currency."""
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        args = context.args or []
+        on_date = None
+        if len(args) == 5 and args[3].lower() in ('on', 'на'):
+            on_date = parse_date(args[4])
+            if on_date is None:
+                await update.message.reply_text("❌ Дата должна быть в формате ДД.ММ.ГГГГ")
+                return
+            args = args[:3]
+
+        if len(args) != 3:
+            await update.message.reply_text(
+                "❌ Неправильный формат команды.\n"
+                "Используйте: /convert <сумма> <из валюты> <в валюту> [на <дата>]\n"
+                "Пример: /convert 100 USD RUB\n"
+                "Пример: /convert 100 USD RUB на 01.10.2026"
+            )
+            return
+
+        amount, from_currency, to_currency = args
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+
+        try:
+            amount = float(amount)
+        except ValueError:
+            await update.message.reply_text("❌ Сумма должна быть числом")
+            return
+
+        if on_date is not None:
+            found = await asyncio.to_thread(rate_on, from_currency, to_currency, on_date)
+            if found is None:
+                await update.message.reply_text(
+                    f"❌ Нет сохранённых курсов {from_currency}/{to_currency} за {on_date.strftime('%d.%m.%Y')}"
+                )
+                return
+            rate, fetched_at = found
+            await update.message.reply_text(
+                f"💱 Результат конвертации на {on_date.strftime('%d.%m.%Y')}:\n\n"
+                f"{amount} {from_currency} = {amount * rate:.2f} {to_currency}\n"
+                f"Курс: 1 {from_currency} = {rate:.4f} {to_currency}\n"
+                f"📅 Данные от {fetched_at.strftime('%d.%m.%Y %H:%M')} UTC"
+            )
+            return
+
+        api_key = os.getenv('CURRENCY_API_KEY')
+        if not api_key:
+            logger.error("CURRENCY_API_KEY не найден в переменных окружения")
+            await update.message.reply_text("❌ Ошибка конфигурации. Пожалуйста, свяжитесь с администратором.")
+            return
+
+        try:
+            response = await fetch_rates(from_currency)
+        except UpstreamUnavailable:
+            await update.message.reply_text("❌ Сервис курсов валют временно недоступен. Попробуйте позже.")
+            return
+        data = response.data
+
+        if response.status_code != 200:
+            logger.error(f"Ошибка при получении курсов валют: {data.get('error', 'Неизвестная ошибка')}")
+            await update.message.reply_text("❌ Не удалось получить курсы валют. Попробуйте позже.")
+            return
+
+        if to_currency not in data['rates']:
+            await update.message.reply_text(f"❌ Валюта {to_currency} не найдена")
+            return
+
+        rate = data['rates'][to_currency]
+        converted_amount = amount * rate
+
+        result_message = (
+            f"💱 Результат конвертации:\n\n"
+            f"{amount} {from_currency} = {converted_amount:.2f} {to_currency}\n"
+            f"Курс: 1 {from_currency} = {rate:.4f} {to_currency}"
+            f"{response.stale_note()}"
+        )
+
+        await update.message.reply_text(result_message)
+        
+    except Exception as e:
+        logger.error(f"Ошибка в handle_convert: {e}")
+        await update.message.reply_text(
+            "❌ Произошла ошибка при конвертации валют.\n"
+            "Проверьте правильность команды и попробуйте снова."
+        )
+
+
+async def handle_rates_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        args = context.args or []
+        if len(args) not in (2, 3) or (len(args) == 3 and not args[2].isdigit()):
+            await update.message.reply_text(
+                "❌ Неправильный формат команды.\n"
+                "Используйте: /rates_history <из валюты> <в валюту> [дней]\n"
+                "Пример: /rates_history USD RUB 30"
+            )
+            return
+
+        from_currency, to_currency = args[0].upper(), args[1].upper()
+        days = min(int(args[2]), 365) if len(args) == 3 else 30
+
+        history = await asyncio.to_thread(rate_history, from_currency, to_currency, days, HISTORY_POINTS)
+        if not history:
+            await update.message.reply_text(f"📉 Нет сохранённых курсов {from_currency}/{to_currency} за {days} дн.")
+            return
+
+        values = [rate for _, rate in history]
+        message = (
+            f"📈 {from_currency}/{to_currency} за {days} дн.\n\n"
+            f"{sparkline(values)}\n\n"
+            f"Мин: {min(values):.4f}\n"
+            f"Макс: {max(values):.4f}\n"
+            f"Последний: {values[-1]:.4f} ({history[-1][0].strftime('%d.%m.%Y %H:%M')} UTC)"
+        )
+        await update.message.reply_text(message)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_rates_history: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
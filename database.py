@@ -1,17 +1,48 @@
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+import os
+import socket
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, func, inspect, or_, select, text, Column, Integer, String, DateTime, ForeignKey, Text, LargeBinary, Index, Float, Boolean, Date
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, backref
 from datetime import datetime
+from cache import TTLCache
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///notibot.db')
+SQL_ECHO = os.getenv('SQL_ECHO', '').lower() in ('1', 'true', 'yes')
+# sqlite — журнал изменений в базе, redis — pub/sub, none — только этот процесс.
+INVALIDATION_BACKEND = os.getenv('INVALIDATION_BACKEND', 'sqlite')
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+
 Base = declarative_base()
-engine = create_engine('sqlite:///notibot.db', echo=True)
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
 Session = sessionmaker(bind=engine)
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Несколько процессов-шардов пишут в один файл базы: WAL позволяет
+    # читать во время записи, а busy_timeout ждёт блокировку вместо ошибки.
+    if engine.dialect.name != 'sqlite':
+        return
+    cursor = dbapi_connection.cursor()
+    # Действует только для новой базы: освобождённые страницы возвращаются
+    # по частям через incremental_vacuum, без долгого полного VACUUM.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -30,17 +61,76 @@ class User(Base):
 
 class Note(Base):
     __tablename__ = 'notes'
+    __table_args__ = (
+        Index('ix_notes_user_folder', 'user_id', 'folder_id'),
+        # Частичные индексы: списки читают только живые строки, очистка —
+        # только удалённые, и ни один из индексов не растёт за счёт другого.
+        Index('ix_notes_user_live', 'user_id', 'id',
+              sqlite_where=text('deleted_at IS NULL'), postgresql_where=text('deleted_at IS NULL')),
+        Index('ix_notes_deleted_at', 'deleted_at',
+              sqlite_where=text('deleted_at IS NOT NULL'), postgresql_where=text('deleted_at IS NOT NULL')),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     content = Column(Text)
+    folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    archived_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="notes")
 
 
+class Tag(Base):
+    __tablename__ = 'tags'
+    __table_args__ = (Index('ix_tags_user_name', 'user_id', 'name', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    name = Column(String)
+    note_count = Column(Integer, default=0)
+
+
+class NoteTag(Base):
+    __tablename__ = 'note_tags'
+    __table_args__ = (Index('ix_note_tags_tag_note', 'tag_id', 'note_id'),)
+
+    note_id = Column(Integer, ForeignKey('notes.id'), primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.id'), primary_key=True)
+
+
+class Folder(Base):
+    __tablename__ = 'folders'
+    __table_args__ = (Index('ix_folders_user_name', 'user_id', 'name', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    name = Column(String)
+    note_count = Column(Integer, default=0)
+
+
+class NoteRevision(Base):
+    __tablename__ = 'note_revisions'
+    __table_args__ = (Index('ix_note_revisions_note_version', 'note_id', 'version', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey('notes.id'))
+    version = Column(Integer)
+    is_snapshot = Column(Boolean, default=False)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Goal(Base):
     __tablename__ = 'goals'
+    __table_args__ = (
+        Index('ix_goals_user_id', 'user_id'),
+        Index('ix_goals_user_live', 'user_id', 'id',
+              sqlite_where=text('deleted_at IS NULL'), postgresql_where=text('deleted_at IS NULL')),
+        Index('ix_goals_deleted_at', 'deleted_at',
+              sqlite_where=text('deleted_at IS NOT NULL'), postgresql_where=text('deleted_at IS NOT NULL')),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -48,12 +138,18 @@ class Goal(Base):
     description = Column(Text)
     status = Column(String, default='active')
     created_at = Column(DateTime, default=datetime.utcnow)
+    archived_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="goals")
 
 
 class Image(Base):
     __tablename__ = 'images'
+    __table_args__ = (
+        Index('ix_images_note_id', 'note_id'),
+        Index('ix_images_user_id', 'user_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -63,10 +159,15 @@ class Image(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="images")
-    note = relationship("Note", backref="images")
+    note = relationship("Note", backref=backref("images", cascade="all, delete-orphan"))
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        Index('ix_messages_user_id', 'user_id'),
+        # Очистка старых сообщений ищет их по дате, не просматривая всю таблицу.
+        Index('ix_messages_created_at', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -76,10 +177,239 @@ class Message(Base):
     user = relationship("User", back_populates="messages")
 
 
+class QuizProgress(Base):
+    __tablename__ = 'quiz_progress'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    seen = Column(LargeBinary)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class QuizScore(Base):
+    __tablename__ = 'quiz_scores'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    category = Column(String)
+    difficulty = Column(String)
+    score = Column(Integer)
+    total = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class GameResult(Base):
+    __tablename__ = 'game_results'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    game = Column(String)
+    points = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class GameScore(Base):
+    __tablename__ = 'game_scores'
+    __table_args__ = (Index('ix_game_scores_game_total', 'game', 'total'),)
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    game = Column(String, primary_key=True)
+    total = Column(Integer, default=0)
+    played = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RateSnapshot(Base):
+    __tablename__ = 'rate_snapshots'
+    __table_args__ = (
+        Index('ix_rate_snapshots_base_fetched_at', 'base', 'fetched_at'),
+        Index('ix_rate_snapshots_fetched_at', 'fetched_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    base = Column(String(3))
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    source_updated_at = Column(Integer)
+    rates = Column(LargeBinary)
+
+
+class CurrencyAlert(Base):
+    __tablename__ = 'currency_alerts'
+    __table_args__ = (Index('ix_currency_alerts_active', 'active', 'chat_id'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    chat_id = Column(Integer)
+    from_currency = Column(String(3))
+    to_currency = Column(String(3))
+    direction = Column(String(1))
+    threshold = Column(Float)
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    triggered_at = Column(DateTime, nullable=True)
+
+
+class WeatherSubscription(Base):
+    __tablename__ = 'weather_subscriptions'
+    __table_args__ = (Index('ix_weather_subscriptions_due', 'active', 'send_minute', 'last_sent_on'),)
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    chat_id = Column(Integer)
+    city = Column(String)
+    city_key = Column(String)
+    send_minute = Column(Integer)
+    active = Column(Boolean, default=True)
+    last_sent_on = Column(Date, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    __table_args__ = (Index('ix_broadcasts_status', 'status'),)
+
+    id = Column(Integer, primary_key=True)
+    text = Column(Text)
+    created_by = Column(Integer)
+    status = Column(String, default='running')
+    last_user_id = Column(Integer, default=0)
+    sent_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class DeliveryFailure(Base):
+    __tablename__ = 'delivery_failures'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    reason = Column(String)
+    failed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UsageRollup(Base):
+    __tablename__ = 'usage_rollups'
+
+    day = Column(Date, primary_key=True)
+    feature = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    events = Column(Integer, default=0)
+    sketch = Column(LargeBinary)
+
+
+class CacheInvalidation(Base):
+    __tablename__ = 'cache_invalidations'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    # AUTOINCREMENT: номера не переиспользуются после очистки, поэтому курсор
+    # читателя (последний обработанный id) не пропускает новые записи.
+    id = Column(Integer, primary_key=True)
+    key = Column(String)
+    origin = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Ключи изменённых данных собираются в session.info и после коммита
+# передаются подписчикам из commit_hooks (см. invalidation.py).
+commit_hooks = []
+# Префиксы ключей, у которых есть кэш; остальные изменения не публикуются.
+CACHED_PREFIXES = {"user", "notes", "rates", "game_scores"}
+
+user_cache = TTLCache(USER_CACHE_SIZE, CACHE_TTL)
+# Меню тегов и папок: ключ (вид, user_id).
+menu_cache = TTLCache(USER_CACHE_SIZE, CACHE_TTL)
+
+
+def mark_changed(session, *keys):
+    """Record cache keys to invalidate when the session commits.
+
+    Inserts and changes of User and Note objects are recorded automatically;
+    bulk UPDATE/DELETE statements have to call this. Keys without a cache
+    in CACHED_PREFIXES are ignored.
+    """
+    keys = [key for key in keys if key.partition(':')[0] in CACHED_PREFIXES]
+    if keys:
+        session.info.setdefault('changed_keys', set()).update(keys)
+
+
+def drop_cached(keys) -> None:
+    """Forget cached users and menus for the changed keys."""
+    for key in keys:
+        prefix, _, ident = key.partition(':')
+        if prefix == 'user':
+            user_cache.delete(int(ident))
+        elif prefix == 'notes':
+            menu_cache.delete(('tags', int(ident)))
+            menu_cache.delete(('folders', int(ident)))
+
+
+commit_hooks.append(drop_cached)
+
+
+def _cache_key(obj):
+    if isinstance(obj, User):
+        return f"user:{obj.telegram_id}"
+    if isinstance(obj, Note):
+        return f"notes:{obj.user_id}"
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_keys(session, flush_context):
+    keys = {_cache_key(obj) for obj in (*session.new, *session.dirty, *session.deleted)}
+    keys.discard(None)
+    if keys:
+        mark_changed(session, *keys)
+
+
+@event.listens_for(Session, "before_commit")
+def _log_changed_keys(session):
+    # Последний flush выполняется внутри commit уже после этого события,
+    # поэтому изменения сбрасываются заранее, чтобы собрать все ключи.
+    session.flush()
+    keys = session.info.get('changed_keys')
+    if keys and INVALIDATION_BACKEND == 'sqlite':
+        # Запись в журнал входит в ту же транзакцию, что и само изменение.
+        session.execute(CacheInvalidation.__table__.insert(), [
+            {"key": key, "origin": PROCESS_ID, "created_at": datetime.utcnow()} for key in sorted(keys)
+        ])
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changed_keys(session):
+    keys = session.info.pop('changed_keys', None)
+    if keys:
+        for hook in commit_hooks:
+            hook(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changed_keys(session):
+    session.info.pop('changed_keys', None)
+
+
+def _add_missing_columns():
+    """Add nullable columns that were added to models after their table was created."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    logger.info(f"Добавление колонки {table.name}.{column.name}")
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                    )
+
+
 def init_db():
     try:
         logger.info("Инициализация базы данных...")
         Base.metadata.create_all(engine)
+        _add_missing_columns()
+        # create_all не трогает уже существующие таблицы, поэтому индексы,
+        # добавленные позже, создаются отдельно.
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
         logger.info("База данных успешно инициализирована")
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
@@ -89,15 +419,38 @@ def init_db():
 def create_user(telegram_id, username, first_name, last_name):
     try:
         session = Session()
-        user = User(
+        values = dict(
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name
         )
-        session.add(user)
-        session.commit()
-        logger.info(f"Создан новый пользователь: {username}")
+        # Одновременные /start от одного пользователя не должны падать на
+        # уникальном telegram_id: вставка превращается в обновление имени.
+        if engine.dialect.name == 'sqlite':
+            insert = sqlite_insert(User)
+        elif engine.dialect.name == 'postgresql':
+            insert = postgresql_insert(User)
+        else:
+            insert = None
+
+        if insert is not None:
+            insert = insert.values(**values).on_conflict_do_update(
+                index_elements=['telegram_id'],
+                set_=dict(username=username, first_name=first_name, last_name=last_name)
+            )
+            session.execute(insert)
+            mark_changed(session, f"user:{telegram_id}")
+            session.commit()
+        else:
+            try:
+                session.add(User(**values))
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+
+        user = session.query(User).filter_by(telegram_id=telegram_id).one()
+        logger.info("Создан новый пользователь: %s", username)
         return user
     except Exception as e:
         logger.error(f"Ошибка при создании пользователя: {e}")
@@ -106,10 +459,1104 @@ def create_user(telegram_id, username, first_name, last_name):
 
 
 def get_user(telegram_id):
+    """The user by Telegram id, detached and cached until the user row changes."""
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+    session = Session()
     try:
-        session = Session()
         user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        if user is not None:
+            session.expunge(user)
+            user_cache.set(telegram_id, user)
         return user
     except Exception as e:
         logger.error(f"Ошибка при получении пользователя: {e}")
         raise
+    finally:
+        session.close()
+
+
+def get_quiz_progress(user_id):
+    session = Session()
+    try:
+        progress = session.get(QuizProgress, user_id)
+        return bytearray(progress.seen) if progress and progress.seen else bytearray()
+    except Exception as e:
+        logger.error(f"Ошибка при получении прогресса викторины: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def save_quiz_result(user_id, seen, category, difficulty, score, total):
+    session = Session()
+    try:
+        progress = session.get(QuizProgress, user_id)
+        if progress is None:
+            progress = QuizProgress(user_id=user_id)
+            session.add(progress)
+        progress.seen = bytes(seen)
+        progress.updated_at = datetime.utcnow()
+        session.add(QuizScore(
+            user_id=user_id,
+            category=category,
+            difficulty=difficulty,
+            score=score,
+            total=total
+        ))
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении результата викторины: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def record_game_result(user_id, game, points):
+    """Store one finished game and return the updated totals as {game: total}."""
+    session = Session()
+    try:
+        session.add(GameResult(user_id=user_id, game=game, points=points))
+        totals = {}
+        for key in (game, 'all'):
+            score = session.get(GameScore, (user_id, key))
+            if score is None:
+                score = GameScore(user_id=user_id, game=key, total=0, played=0)
+                session.add(score)
+            score.total += points
+            score.played += 1
+            score.updated_at = datetime.utcnow()
+            totals[key] = score.total
+        mark_changed(session, f"game_scores:{user_id}")
+        session.commit()
+        return totals
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении результата игры: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_game_scores():
+    session = Session()
+    try:
+        return session.query(GameScore.game, GameScore.user_id, GameScore.total).all()
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке рейтинга: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_user_game_scores(user_id):
+    session = Session()
+    try:
+        return session.query(GameScore.game, GameScore.total).filter_by(user_id=user_id).all()
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке рейтинга: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_usernames(user_ids):
+    session = Session()
+    try:
+        users = session.query(User.id, User.username, User.first_name).filter(User.id.in_(user_ids)).all()
+        return {user_id: username or first_name for user_id, username, first_name in users}
+    except Exception as e:
+        logger.error(f"Ошибка при получении имён пользователей: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def save_rate_snapshot(base, fetched_at, source_updated_at, rates):
+    session = Session()
+    try:
+        session.add(RateSnapshot(
+            base=base,
+            fetched_at=fetched_at,
+            source_updated_at=source_updated_at,
+            rates=rates
+        ))
+        mark_changed(session, f"rates:{base}")
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении курсов валют: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_latest_rate_snapshots():
+    session = Session()
+    try:
+        latest = (
+            session.query(RateSnapshot.base, func.max(RateSnapshot.fetched_at).label('fetched_at'))
+            .group_by(RateSnapshot.base)
+            .subquery()
+        )
+        return (
+            session.query(RateSnapshot.base, RateSnapshot.fetched_at, RateSnapshot.source_updated_at, RateSnapshot.rates)
+            .join(latest, (RateSnapshot.base == latest.c.base) & (RateSnapshot.fetched_at == latest.c.fetched_at))
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке курсов валют: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_latest_rate_snapshot(base):
+    """(fetched_at, source_updated_at, rates) of the newest snapshot of one base currency."""
+    session = Session()
+    try:
+        return (
+            session.query(RateSnapshot.fetched_at, RateSnapshot.source_updated_at, RateSnapshot.rates)
+            .filter(RateSnapshot.base == base)
+            .order_by(RateSnapshot.fetched_at.desc())
+            .first()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке курсов валют: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_rate_snapshot_index(start, end):
+    session = Session()
+    try:
+        return (
+            session.query(RateSnapshot.id, RateSnapshot.base, RateSnapshot.fetched_at)
+            .filter(RateSnapshot.fetched_at >= start, RateSnapshot.fetched_at < end)
+            .order_by(RateSnapshot.fetched_at)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке истории курсов: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_rate_snapshot_payloads(snapshot_ids):
+    session = Session()
+    try:
+        rows = session.query(RateSnapshot.id, RateSnapshot.rates).filter(RateSnapshot.id.in_(snapshot_ids)).all()
+        return dict(rows)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке истории курсов: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def create_currency_alert(user_id, chat_id, from_currency, to_currency, direction, threshold):
+    session = Session()
+    try:
+        alert = CurrencyAlert(
+            user_id=user_id,
+            chat_id=chat_id,
+            from_currency=from_currency,
+            to_currency=to_currency,
+            direction=direction,
+            threshold=threshold
+        )
+        session.add(alert)
+        session.commit()
+        session.refresh(alert)
+        session.expunge(alert)
+        return alert
+    except Exception as e:
+        logger.error(f"Ошибка при создании уведомления о курсе: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_active_currency_alerts(user_id=None, shard=0, shards=1):
+    session = Session()
+    try:
+        query = session.query(CurrencyAlert).filter_by(active=True)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        if shards > 1:
+            query = query.filter(CurrencyAlert.chat_id % shards == shard)
+        alerts = query.order_by(CurrencyAlert.id).all()
+        session.expunge_all()
+        return alerts
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке уведомлений о курсе: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def deactivate_currency_alerts(alert_ids, user_id=None):
+    session = Session()
+    try:
+        query = session.query(CurrencyAlert).filter(CurrencyAlert.id.in_(alert_ids), CurrencyAlert.active.is_(True))
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        updated = query.update(
+            {CurrencyAlert.active: False, CurrencyAlert.triggered_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        session.commit()
+        return updated
+    except Exception as e:
+        logger.error(f"Ошибка при отключении уведомлений о курсе: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def save_weather_subscription(user_id, chat_id, city, city_key, send_minute):
+    session = Session()
+    try:
+        subscription = session.get(WeatherSubscription, user_id)
+        if subscription is None:
+            subscription = WeatherSubscription(user_id=user_id)
+            session.add(subscription)
+        subscription.chat_id = chat_id
+        subscription.city = city
+        subscription.city_key = city_key
+        subscription.send_minute = send_minute
+        subscription.active = True
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении подписки на погоду: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_weather_subscription(user_id):
+    session = Session()
+    try:
+        subscription = session.query(WeatherSubscription).filter_by(user_id=user_id, active=True).first()
+        session.expunge_all()
+        return subscription
+    except Exception as e:
+        logger.error(f"Ошибка при получении подписки на погоду: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def disable_weather_subscription(user_id):
+    session = Session()
+    try:
+        updated = session.query(WeatherSubscription).filter_by(user_id=user_id, active=True).update(
+            {WeatherSubscription.active: False}, synchronize_session=False
+        )
+        session.commit()
+        return updated
+    except Exception as e:
+        logger.error(f"Ошибка при отключении подписки на погоду: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_due_weather_subscriptions(today, minute, shard=0, shards=1):
+    session = Session()
+    try:
+        query = session.query(
+            WeatherSubscription.user_id,
+            WeatherSubscription.chat_id,
+            WeatherSubscription.city,
+            WeatherSubscription.city_key
+        ).filter(
+            WeatherSubscription.active.is_(True),
+            WeatherSubscription.send_minute <= minute,
+            or_(WeatherSubscription.last_sent_on.is_(None), WeatherSubscription.last_sent_on < today)
+        )
+        if shards > 1:
+            query = query.filter(WeatherSubscription.chat_id % shards == shard)
+        return query.all()
+    except Exception as e:
+        logger.error(f"Ошибка при получении подписок на погоду: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def mark_weather_digests_sent(user_ids, today):
+    session = Session()
+    try:
+        session.query(WeatherSubscription).filter(WeatherSubscription.user_id.in_(user_ids)).update(
+            {WeatherSubscription.last_sent_on: today}, synchronize_session=False
+        )
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении подписок на погоду: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def create_broadcast(text, created_by):
+    session = Session()
+    try:
+        broadcast = Broadcast(text=text, created_by=created_by, status='running', last_user_id=0)
+        session.add(broadcast)
+        session.commit()
+        return broadcast.id
+    except Exception as e:
+        logger.error(f"Ошибка при создании рассылки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_broadcast(broadcast_id=None, status=None):
+    session = Session()
+    try:
+        query = session.query(Broadcast)
+        if broadcast_id is not None:
+            query = query.filter_by(id=broadcast_id)
+        if status is not None:
+            query = query.filter_by(status=status).order_by(Broadcast.id)
+        else:
+            query = query.order_by(Broadcast.id.desc())
+        broadcast = query.first()
+        session.expunge_all()
+        return broadcast
+    except Exception as e:
+        logger.error(f"Ошибка при получении рассылки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_broadcast_recipients(after_user_id, limit):
+    """Next page of users by primary key, skipping users we can no longer message."""
+    session = Session()
+    try:
+        return (
+            session.query(User.id, User.telegram_id)
+            .outerjoin(DeliveryFailure, DeliveryFailure.user_id == User.id)
+            .filter(User.id > after_user_id, DeliveryFailure.user_id.is_(None))
+            .order_by(User.id)
+            .limit(limit)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении получателей рассылки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def checkpoint_broadcast(broadcast_id, last_user_id, sent, failed, failures, status=None):
+    """Save progress and permanent failures in one transaction and return the current status."""
+    session = Session()
+    try:
+        for user_id, reason in failures:
+            session.merge(DeliveryFailure(user_id=user_id, reason=reason, failed_at=datetime.utcnow()))
+        broadcast = session.get(Broadcast, broadcast_id)
+        broadcast.last_user_id = last_user_id
+        broadcast.sent_count += sent
+        broadcast.failed_count += failed
+        if status is not None and broadcast.status == 'running':
+            broadcast.status = status
+            broadcast.finished_at = datetime.utcnow()
+        session.commit()
+        return broadcast.status
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении прогресса рассылки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def cancel_broadcast(broadcast_id):
+    session = Session()
+    try:
+        updated = session.query(Broadcast).filter_by(id=broadcast_id, status='running').update(
+            {Broadcast.status: 'cancelled', Broadcast.finished_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        session.commit()
+        return updated
+    except Exception as e:
+        logger.error(f"Ошибка при отмене рассылки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def clear_delivery_failure(user_id):
+    """Let broadcasts reach the user again; writes only if a failure was recorded."""
+    session = Session()
+    try:
+        failure = session.get(DeliveryFailure, user_id)
+        if failure is None:
+            return False
+        session.delete(failure)
+        session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сбросе ошибки доставки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_expired_messages(before, limit):
+    """Oldest messages created before `before`, at most `limit` of them."""
+    session = Session()
+    try:
+        return (
+            session.query(Message.id, Message.user_id, Message.content, Message.created_at)
+            .filter(Message.created_at < before)
+            .order_by(Message.created_at, Message.id)
+            .limit(limit)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении старых сообщений: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def delete_messages(message_ids):
+    session = Session()
+    try:
+        deleted = session.query(Message).filter(Message.id.in_(message_ids)).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при удалении сообщений: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def incremental_vacuum(pages):
+    """Return up to `pages` free pages to the OS and report how many are left.
+
+    Returns None when the database cannot be vacuumed incrementally: it is not
+    SQLite, or it was created before auto_vacuum=INCREMENTAL was enabled and
+    needs one offline VACUUM first.
+    """
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return None
+        connection.exec_driver_sql(f"PRAGMA incremental_vacuum({int(pages)})")
+        connection.commit()
+        return connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def get_usage_rollups(start_day, end_day, shard=None):
+    """(day, feature, events, sketch) rows for start_day <= day <= end_day."""
+    session = Session()
+    try:
+        query = session.query(UsageRollup.day, UsageRollup.feature, UsageRollup.events, UsageRollup.sketch).filter(
+            UsageRollup.day >= start_day,
+            UsageRollup.day <= end_day
+        )
+        if shard is not None:
+            query = query.filter(UsageRollup.shard == shard)
+        return query.all()
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики использования: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def save_usage_rollups(shard, rollups):
+    """Overwrite this shard's rows with (day, feature, events, sketch) tuples."""
+    session = Session()
+    try:
+        for day, feature, events, sketch in rollups:
+            session.merge(UsageRollup(day=day, feature=feature, shard=shard, events=events, sketch=sketch))
+        session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении статистики использования: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_note(note_id, user_id):
+    session = Session()
+    try:
+        note = session.query(Note).filter_by(id=note_id, user_id=user_id, deleted_at=None).first()
+        session.expunge_all()
+        return note
+    except Exception as e:
+        logger.error(f"Ошибка при получении заметки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_note_versions(note_id):
+    """(version, is_snapshot, created_at) of every stored revision, oldest first, without payloads."""
+    session = Session()
+    try:
+        return (
+            session.query(NoteRevision.version, NoteRevision.is_snapshot, NoteRevision.created_at)
+            .filter_by(note_id=note_id)
+            .order_by(NoteRevision.version)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении истории заметки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_note_revision_chain(note_id, version):
+    """Payloads needed to rebuild `version`: the closest snapshot at or below it and the deltas after it."""
+    session = Session()
+    try:
+        snapshot_version = session.query(func.max(NoteRevision.version)).filter(
+            NoteRevision.note_id == note_id,
+            NoteRevision.is_snapshot.is_(True),
+            NoteRevision.version <= version
+        ).scalar()
+        if snapshot_version is None:
+            return []
+        return (
+            session.query(NoteRevision.version, NoteRevision.is_snapshot, NoteRevision.data)
+            .filter(
+                NoteRevision.note_id == note_id,
+                NoteRevision.version >= snapshot_version,
+                NoteRevision.version <= version
+            )
+            .order_by(NoteRevision.version)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении версии заметки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def save_note_edit(note_id, user_id, content, revisions, tags=None):
+    """Store new revisions and the new current content in one transaction.
+
+    `revisions` holds (version, is_snapshot, data) tuples. The unique index on
+    (note_id, version) makes a concurrent edit of the same version fail
+    instead of forking the history.
+    """
+    session = Session()
+    try:
+        # Архивные заметки не входят в счётчики тегов, поэтому их не меняют.
+        updated = session.query(Note).filter_by(id=note_id, user_id=user_id, archived_at=None, deleted_at=None).update(
+            {Note.content: content}, synchronize_session=False
+        )
+        if not updated:
+            session.rollback()
+            return False
+        for version, is_snapshot, data in revisions:
+            session.add(NoteRevision(note_id=note_id, version=version, is_snapshot=is_snapshot, data=data))
+        if tags is not None:
+            _set_note_tags(session, note_id, user_id, tags)
+        mark_changed(session, f"notes:{user_id}")
+        session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении заметки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _set_note_tags(session, note_id, user_id, names):
+    """Make the note's tags exactly `names`, keeping Tag.note_count in step."""
+    names = set(names)
+    current = dict(
+        session.query(Tag.name, Tag.id)
+        .join(NoteTag, NoteTag.tag_id == Tag.id)
+        .filter(NoteTag.note_id == note_id)
+        .all()
+    )
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    added = names - current.keys()
+    if removed:
+        session.query(NoteTag).filter(NoteTag.note_id == note_id, NoteTag.tag_id.in_(removed)).delete(
+            synchronize_session=False
+        )
+        session.query(Tag).filter(Tag.id.in_(removed)).update(
+            {Tag.note_count: Tag.note_count - 1}, synchronize_session=False
+        )
+    if added:
+        tag_ids = dict(session.query(Tag.name, Tag.id).filter(Tag.user_id == user_id, Tag.name.in_(added)).all())
+        for name in added - tag_ids.keys():
+            tag = Tag(user_id=user_id, name=name, note_count=0)
+            session.add(tag)
+            session.flush()
+            tag_ids[name] = tag.id
+        session.add_all([NoteTag(note_id=note_id, tag_id=tag_id) for tag_id in tag_ids.values()])
+        session.query(Tag).filter(Tag.id.in_(tag_ids.values())).update(
+            {Tag.note_count: Tag.note_count + 1}, synchronize_session=False
+        )
+
+
+def create_note(user_id, content, tags=()):
+    session = Session()
+    try:
+        note = Note(user_id=user_id, content=content)
+        session.add(note)
+        session.flush()
+        _set_note_tags(session, note.id, user_id, tags)
+        session.commit()
+        return note.id
+    except Exception as e:
+        logger.error(f"Ошибка при создании заметки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_notes(user_id, tag_id=None, folder_id=None, archived=False):
+    """A user's notes with their images loaded, optionally only one tag or folder."""
+    session = Session()
+    try:
+        query = session.query(Note).options(selectinload(Note.images)).filter(
+            Note.user_id == user_id,
+            Note.deleted_at.is_(None),
+            Note.archived_at.is_(None) if not archived else Note.archived_at.isnot(None)
+        )
+        if tag_id is not None:
+            query = query.join(NoteTag, NoteTag.note_id == Note.id).filter(NoteTag.tag_id == tag_id)
+        if folder_id is not None:
+            query = query.filter(Note.folder_id == folder_id)
+        notes = query.order_by(Note.id).all()
+        session.expunge_all()
+        return notes
+    except Exception as e:
+        logger.error(f"Ошибка при получении заметок: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_note_image(note_id, user_id):
+    """(file_id, note content) of the first image of a user's active note, or None.
+
+    Deleted and archived notes are not listed, so buttons left in old
+    messages must not reach them either.
+    """
+    session = Session()
+    try:
+        return (
+            session.query(Image.file_id, Note.content)
+            .join(Note, Note.id == Image.note_id)
+            .filter(
+                Image.note_id == note_id, Image.user_id == user_id,
+                Note.deleted_at.is_(None), Note.archived_at.is_(None)
+            )
+            .first()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении изображения: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_tags(user_id):
+    """(id, name, note_count) of the user's tags in use; the counts are stored, not computed."""
+    tags = menu_cache.get(('tags', user_id))
+    if tags is not None:
+        return tags
+    session = Session()
+    try:
+        tags = (
+            session.query(Tag.id, Tag.name, Tag.note_count)
+            .filter(Tag.user_id == user_id, Tag.note_count > 0)
+            .order_by(Tag.name)
+            .all()
+        )
+        menu_cache.set(('tags', user_id), tags)
+        return tags
+    except Exception as e:
+        logger.error(f"Ошибка при получении тегов: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_tag(tag_id, user_id):
+    session = Session()
+    try:
+        return session.query(Tag.id, Tag.name, Tag.note_count).filter_by(id=tag_id, user_id=user_id).first()
+    except Exception as e:
+        logger.error(f"Ошибка при получении тега: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def create_folder(user_id, name):
+    session = Session()
+    try:
+        folder = session.query(Folder).filter_by(user_id=user_id, name=name).first()
+        if folder is None:
+            folder = Folder(user_id=user_id, name=name, note_count=0)
+            session.add(folder)
+            mark_changed(session, f"notes:{user_id}")
+            session.commit()
+        return folder.id
+    except Exception as e:
+        logger.error(f"Ошибка при создании папки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_folders(user_id):
+    folders = menu_cache.get(('folders', user_id))
+    if folders is not None:
+        return folders
+    session = Session()
+    try:
+        folders = (
+            session.query(Folder.id, Folder.name, Folder.note_count)
+            .filter_by(user_id=user_id)
+            .order_by(Folder.name)
+            .all()
+        )
+        menu_cache.set(('folders', user_id), folders)
+        return folders
+    except Exception as e:
+        logger.error(f"Ошибка при получении папок: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_folder(folder_id, user_id):
+    session = Session()
+    try:
+        return session.query(Folder.id, Folder.name, Folder.note_count).filter_by(id=folder_id, user_id=user_id).first()
+    except Exception as e:
+        logger.error(f"Ошибка при получении папки: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def move_note(note_id, user_id, folder_id):
+    """Put a note into a folder (None takes it out) and update both folders' counts."""
+    session = Session()
+    try:
+        note = session.query(Note).filter_by(id=note_id, user_id=user_id, archived_at=None, deleted_at=None).first()
+        if note is None:
+            return False
+        if folder_id is not None and not session.query(Folder.id).filter_by(id=folder_id, user_id=user_id).first():
+            return False
+        if note.folder_id != folder_id:
+            if note.folder_id is not None:
+                session.query(Folder).filter_by(id=note.folder_id).update(
+                    {Folder.note_count: Folder.note_count - 1}, synchronize_session=False
+                )
+            if folder_id is not None:
+                session.query(Folder).filter_by(id=folder_id).update(
+                    {Folder.note_count: Folder.note_count + 1}, synchronize_session=False
+                )
+            note.folder_id = folder_id
+        session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при перемещении заметки: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _selected(query, model, user_id, ids):
+    query = query.where(model.user_id == user_id, model.deleted_at.is_(None))
+    return query if ids is None else query.where(model.id.in_(ids))
+
+
+def _adjust_note_counts(session, user_id, note_ids, delta):
+    """Add `delta` to the tag and folder counts once per note in the `note_ids` subquery.
+
+    One UPDATE per table whatever the number of notes.
+    """
+    session.query(Tag).filter(Tag.user_id == user_id).update({
+        Tag.note_count: Tag.note_count + delta * (
+            select(func.count())
+            .where(NoteTag.tag_id == Tag.id, NoteTag.note_id.in_(note_ids))
+            .scalar_subquery()
+        )
+    }, synchronize_session=False)
+    session.query(Folder).filter(Folder.user_id == user_id).update({
+        Folder.note_count: Folder.note_count + delta * (
+            select(func.count())
+            .where(Note.folder_id == Folder.id, Note.id.in_(note_ids))
+            .scalar_subquery()
+        )
+    }, synchronize_session=False)
+
+
+def delete_notes(user_id, note_ids=None, deleted_at=None):
+    """Mark the given notes, or all of the user's notes, as deleted.
+
+    The rows stay in place until purge_deleted() removes them, so the delete
+    can be undone with restore_deleted() using the same `deleted_at`.
+    """
+    session = Session()
+    try:
+        selected = _selected(select(Note.id), Note, user_id, note_ids)
+        _adjust_note_counts(session, user_id, selected.where(Note.archived_at.is_(None)), -1)
+        deleted = session.query(Note).filter(Note.id.in_(selected)).update(
+            {Note.deleted_at: deleted_at or datetime.utcnow()}, synchronize_session=False
+        )
+        mark_changed(session, f"notes:{user_id}")
+        session.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при удалении заметок: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def set_notes_archived(user_id, archived, note_ids=None):
+    """Archive or restore notes; archived notes are left out of lists and tag and folder counts."""
+    session = Session()
+    try:
+        selected = _selected(select(Note.id), Note, user_id, note_ids).where(
+            Note.archived_at.is_(None) if archived else Note.archived_at.isnot(None)
+        )
+        _adjust_note_counts(session, user_id, selected, -1 if archived else 1)
+        changed = session.query(Note).filter(Note.id.in_(selected)).update(
+            {Note.archived_at: datetime.utcnow() if archived else None}, synchronize_session=False
+        )
+        mark_changed(session, f"notes:{user_id}")
+        session.commit()
+        return changed
+    except Exception as e:
+        logger.error(f"Ошибка при архивировании заметок: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def delete_goals(user_id, goal_ids=None, deleted_at=None):
+    session = Session()
+    try:
+        deleted = session.query(Goal).filter(Goal.id.in_(_selected(select(Goal.id), Goal, user_id, goal_ids))).update(
+            {Goal.deleted_at: deleted_at or datetime.utcnow()}, synchronize_session=False
+        )
+        session.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при удалении целей: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def set_goals_archived(user_id, archived, goal_ids=None):
+    session = Session()
+    try:
+        selected = _selected(select(Goal.id), Goal, user_id, goal_ids).where(
+            Goal.archived_at.is_(None) if archived else Goal.archived_at.isnot(None)
+        )
+        changed = session.query(Goal).filter(Goal.id.in_(selected)).update(
+            {Goal.archived_at: datetime.utcnow() if archived else None}, synchronize_session=False
+        )
+        session.commit()
+        return changed
+    except Exception as e:
+        logger.error(f"Ошибка при архивировании целей: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_goals(user_id):
+    """The user's goals that are neither archived nor deleted."""
+    session = Session()
+    try:
+        goals = session.query(Goal).filter_by(user_id=user_id, archived_at=None, deleted_at=None).all()
+        session.expunge_all()
+        return goals
+    except Exception as e:
+        logger.error(f"Ошибка при получении целей: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_user_stats(user_id):
+    """(notes, goals, images, messages) counts for the statistics screen."""
+    session = Session()
+    try:
+        return (
+            session.query(func.count(Note.id)).filter_by(user_id=user_id, deleted_at=None).scalar(),
+            session.query(func.count(Goal.id)).filter_by(user_id=user_id, deleted_at=None).scalar(),
+            # Картинки без заметки тоже считаются: внешнее соединение даёт им deleted_at = NULL.
+            session.query(func.count(Image.id))
+            .outerjoin(Note, Note.id == Image.note_id)
+            .filter(Image.user_id == user_id, Note.deleted_at.is_(None))
+            .scalar(),
+            session.query(func.count(Message.id)).filter_by(user_id=user_id).scalar(),
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при подсчёте статистики: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_selectable_items(kind, user_id):
+    """(id, label) of the user's active notes or goals for the multi-select menu."""
+    model, label = (Note, Note.content) if kind == 'notes' else (Goal, Goal.title)
+    session = Session()
+    try:
+        return (
+            session.query(model.id, func.substr(label, 1, 40))
+            .filter(model.user_id == user_id, model.deleted_at.is_(None), model.archived_at.is_(None))
+            .order_by(model.id)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка для выбора: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def count_archived(kind, user_id):
+    model = Note if kind == 'notes' else Goal
+    session = Session()
+    try:
+        return session.query(func.count(model.id)).filter(
+            model.user_id == user_id, model.deleted_at.is_(None), model.archived_at.isnot(None)
+        ).scalar()
+    except Exception as e:
+        logger.error(f"Ошибка при подсчёте архива: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def restore_deleted(kind, user_id, deleted_at):
+    """Undo one delete_notes()/delete_goals() call, identified by its `deleted_at`."""
+    model = Note if kind == 'notes' else Goal
+    session = Session()
+    try:
+        selected = select(model.id).where(model.user_id == user_id, model.deleted_at == deleted_at)
+        if model is Note:
+            _adjust_note_counts(session, user_id, selected.where(Note.archived_at.is_(None)), 1)
+        restored = session.query(model).filter(model.id.in_(selected)).update(
+            {model.deleted_at: None}, synchronize_session=False
+        )
+        mark_changed(session, f"{kind}:{user_id}")
+        session.commit()
+        return restored
+    except Exception as e:
+        logger.error(f"Ошибка при восстановлении удалённого: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def purge_deleted(kind, before, limit):
+    """Physically remove up to `limit` notes or goals deleted before `before`.
+
+    Tag and folder counts were already adjusted by the soft delete, so only
+    the rows and what is attached to them are removed here.
+    """
+    model = Note if kind == 'notes' else Goal
+    session = Session()
+    try:
+        ids = [row.id for row in session.query(model.id).filter(model.deleted_at < before).limit(limit)]
+        if not ids:
+            return 0
+        if model is Note:
+            session.query(NoteTag).filter(NoteTag.note_id.in_(ids)).delete(synchronize_session=False)
+            session.query(NoteRevision).filter(NoteRevision.note_id.in_(ids)).delete(synchronize_session=False)
+            session.query(Image).filter(Image.note_id.in_(ids)).delete(synchronize_session=False)
+        purged = session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        session.commit()
+        return purged
+    except Exception as e:
+        logger.error(f"Ошибка при очистке удалённого: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_last_invalidation_id():
+    session = Session()
+    try:
+        return session.query(func.max(CacheInvalidation.id)).scalar() or 0
+    except Exception as e:
+        logger.error(f"Ошибка при чтении журнала изменений: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_invalidations(after_id, limit):
+    """(id, key, origin) of change-log entries after the cursor `after_id`."""
+    session = Session()
+    try:
+        return session.query(CacheInvalidation.id, CacheInvalidation.key, CacheInvalidation.origin).filter(
+            CacheInvalidation.id > after_id
+        ).order_by(CacheInvalidation.id).limit(limit).all()
+    except Exception as e:
+        logger.error(f"Ошибка при чтении журнала изменений: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def delete_invalidations(before):
+    session = Session()
+    try:
+        deleted = session.query(CacheInvalidation).filter(CacheInvalidation.created_at < before).delete(
+            synchronize_session=False
+        )
+        session.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при очистке журнала изменений: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+from array import array
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_WINDOW = int(os.getenv('DEDUPE_WINDOW', '10000'))
+DEDUPE_STATE_FILE = os.getenv('DEDUPE_STATE_FILE')
+
+
+class DedupeWindow:
+    """Remembers the last `size` update ids.
+
+    The ring buffer decides which id is forgotten next, the set answers
+    membership in O(1); memory stays bounded no matter how long the bot runs.
+    """
+
+    def __init__(self, size: int):
+        self._ring = array('q', [-1]) * size
+        self._ids = set()
+        self._position = 0
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._ids
+
+    def add(self, update_id: int) -> bool:
+        if update_id in self._ids:
+            return False
+        evicted = self._ring[self._position]
+        if evicted != -1:
+            self._ids.discard(evicted)
+        self._ring[self._position] = update_id
+        self._ids.add(update_id)
+        self._position = (self._position + 1) % len(self._ring)
+        return True
+
+    def snapshot(self):
+        ordered = self._ring[self._position:] + self._ring[:self._position]
+        return [update_id for update_id in ordered if update_id != -1]
+
+
+processed_updates = DedupeWindow(DEDUPE_WINDOW)
+
+
+async def skip_duplicate_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not processed_updates.add(update.update_id):
+        logger.info("Повторное обновление %s пропущено", update.update_id)
+        raise ApplicationHandlerStop
+
+
+def load_processed_updates(path: str = DEDUPE_STATE_FILE) -> None:
+    if not path or not os.path.exists(path):
+        return
+    try:
+        with open(path) as f:
+            update_ids = json.load(f)
+        for update_id in update_ids:
+            processed_updates.add(update_id)
+        logger.info(f"Загружено обработанных обновлений: {len(update_ids)}")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке обработанных обновлений: {e}")
+
+
+def save_processed_updates(path: str = DEDUPE_STATE_FILE) -> None:
+    if not path:
+        return
+    try:
+        with open(path, 'w') as f:
+            json.dump(processed_updates.snapshot(), f)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении обработанных обновлений: {e}")
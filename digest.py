@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from background import start_background_task
+from database import (
+    get_user,
+    save_weather_subscription,
+    get_weather_subscription,
+    disable_weather_subscription,
+    get_due_weather_subscriptions,
+    mark_weather_digests_sent
+)
+from resilience import UpstreamUnavailable
+from weather import fetch_weather, format_weather, normalize_city
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TIMEZONE = ZoneInfo(os.getenv('DIGEST_TIMEZONE', 'Europe/Moscow'))
+DIGEST_TICK = 60
+DIGEST_FETCH_CONCURRENCY = int(os.getenv('DIGEST_FETCH_CONCURRENCY', '5'))
+DIGEST_MESSAGES_PER_SECOND = float(os.getenv('DIGEST_MESSAGES_PER_SECOND', '20'))
+DEFAULT_SEND_MINUTE = 8 * 60
+TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+async def _fetch_city(semaphore, city_key, city, api_key):
+    async with semaphore:
+        try:
+            return city_key, await fetch_weather(city, api_key)
+        except UpstreamUnavailable:
+            return city_key, None
+
+
+async def run_digest_cycle(bot, shard: int = 0, shards: int = 1) -> None:
+    """Send every digest that is due now.
+
+    Subscribers are grouped by normalized city, so each city is fetched once
+    per cycle no matter how many users asked for it, and the fetches run in
+    parallel up to DIGEST_FETCH_CONCURRENCY at a time.
+    """
+    now = datetime.now(DIGEST_TIMEZONE)
+    today = now.date()
+    due = await asyncio.to_thread(get_due_weather_subscriptions, today, now.hour * 60 + now.minute, shard, shards)
+    if not due:
+        return
+
+    api_key = os.getenv('WEATHER_API_KEY')
+    if not api_key:
+        logger.error("WEATHER_API_KEY не найден в переменных окружения")
+        return
+
+    by_city = {}
+    for subscription in due:
+        by_city.setdefault(subscription.city_key, []).append(subscription)
+    logger.info(f"Рассылка погоды: {len(due)} подписчиков, {len(by_city)} городов")
+
+    semaphore = asyncio.Semaphore(DIGEST_FETCH_CONCURRENCY)
+    responses = dict(await asyncio.gather(*(
+        _fetch_city(semaphore, city_key, subscriptions[0].city, api_key)
+        for city_key, subscriptions in by_city.items()
+    )))
+
+    # Лимит Telegram общий для бота: каждый шард берёт свою долю.
+    delay = shards / DIGEST_MESSAGES_PER_SECOND
+    for city_key, subscriptions in by_city.items():
+        response = responses[city_key]
+        if response is None or response.status_code >= 500:
+            logger.error(f"Погода для города {city_key} недоступна, повторим позже")
+            continue
+
+        if response.status_code == 200:
+            text = (
+                "☀️ Ежедневная сводка погоды\n\n"
+                f"{format_weather(response.data)}"
+                f"{response.stale_note()}\n\n"
+                "Отписаться: /digest off"
+            )
+        else:
+            text = (
+                f"❌ Не удалось получить погоду для города {subscriptions[0].city}.\n"
+                "Проверьте название: /digest <город> [ЧЧ:ММ]"
+            )
+
+        for subscription in subscriptions:
+            try:
+                await bot.send_message(chat_id=subscription.chat_id, text=text)
+            except TelegramError as e:
+                logger.error(f"Не удалось отправить сводку погоды в чат {subscription.chat_id}: {e}")
+            await asyncio.sleep(delay)
+
+        await asyncio.to_thread(
+            mark_weather_digests_sent,
+            [subscription.user_id for subscription in subscriptions],
+            today
+        )
+
+
+async def _digest_loop(bot, shard: int, shards: int) -> None:
+    while True:
+        try:
+            await run_digest_cycle(bot, shard, shards)
+        except Exception as e:
+            logger.error(f"Ошибка при рассылке погоды: {e}")
+        await asyncio.sleep(DIGEST_TICK)
+
+
+async def start_digest(application, shard: int = 0, shards: int = 1) -> None:
+    start_background_task(_digest_loop(application.bot, shard, shards), "weather-digest")
+
+
+async def handle_digest(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        args = list(context.args or [])
+        if not args:
+            subscription = get_weather_subscription(user.id)
+            if subscription:
+                message = (
+                    f"☀️ Ты подписан на сводку погоды в городе {subscription.city} "
+                    f"в {subscription.send_minute // 60:02d}:{subscription.send_minute % 60:02d}.\n\n"
+                    "Изменить: /digest <город> [ЧЧ:ММ]\n"
+                    "Отписаться: /digest off"
+                )
+            else:
+                message = (
+                    "☀️ Ежедневная сводка погоды\n\n"
+                    "Подписаться: /digest <город> [ЧЧ:ММ]\n"
+                    "Пример: /digest Москва 08:00"
+                )
+            await update.message.reply_text(message)
+            return
+
+        if len(args) == 1 and args[0].lower() in ('off', 'стоп'):
+            if disable_weather_subscription(user.id):
+                await update.message.reply_text("✅ Подписка на сводку погоды отключена.")
+            else:
+                await update.message.reply_text("❌ У тебя нет подписки на сводку погоды.")
+            return
+
+        send_minute = DEFAULT_SEND_MINUTE
+        match = TIME_PATTERN.match(args[-1])
+        if match:
+            send_minute = int(match.group(1)) * 60 + int(match.group(2))
+            args = args[:-1]
+        if not args:
+            await update.message.reply_text("❌ Укажи город. Пример: /digest Москва 08:00")
+            return
+
+        city = " ".join(args)
+        api_key = os.getenv('WEATHER_API_KEY')
+        if api_key:
+            try:
+                response = await fetch_weather(city, api_key)
+                if response.status_code == 404:
+                    await update.message.reply_text(
+                        "❌ Город не найден. Проверьте правильность написания.\n"
+                        "Пример: /digest Москва 08:00"
+                    )
+                    return
+            except UpstreamUnavailable:
+                pass
+
+        save_weather_subscription(user.id, update.effective_user.id, city, normalize_city(city), send_minute)
+        await update.message.reply_text(
+            f"✅ Буду присылать погоду в городе {city} каждый день "
+            f"в {send_minute // 60:02d}:{send_minute % 60:02d}.\n\n"
+            "Отписаться: /digest off"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в handle_digest: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
@@ -0,0 +1,193 @@
+import logging
+import random
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database import get_user
+from leaderboard import record_game
+from states import GUESSING_NUMBER, user_states
+
+logger = logging.getLogger(__name__)
+
+RPS_POINTS = {
+    "Ты победил! 🎉": 3,
+    "Ничья! 🤝": 1,
+    "Я победил! 😎": 0
+}
+
+
+def determine_rps_winner(user_choice: str, bot_choice: str) -> str:
+    if user_choice == bot_choice:
+        return "Ничья! 🤝"
+    
+    winning_combinations = {
+        "rock": "scissors",
+        "paper": "rock",
+        "scissors": "paper"
+    }
+    
+    if winning_combinations[user_choice] == bot_choice:
+        return "Ты победил! 🎉"
+    else:
+        return "Я победил! 😎"
+
+
+async def show_games_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        keyboard = [
+            [
+                InlineKeyboardButton("🎲 Угадай число", callback_data="game_guess"),
+                InlineKeyboardButton("✊ Камень-ножницы-бумага", callback_data="game_rps")
+            ],
+            [InlineKeyboardButton("❓ Викторина", callback_data="game_quiz")],
+            [InlineKeyboardButton("🏆 Рейтинг", callback_data="top_all")],
+            [InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        message = (
+            "🎮 Выбери игру:\n\n"
+            "🎲 Угадай число - попробуй угадать загаданное число от 1 до 100\n"
+            "✊ Камень-ножницы-бумага - классическая игра\n"
+            "❓ Викторина - проверь свои знания\n\n"
+            "Или используй команды:\n"
+            "/guess - начать игру 'Угадай число'\n"
+            "/rps - начать игру 'Камень-ножницы-бумага'\n"
+            "/quiz - начать викторину\n"
+            "/top - рейтинг игроков"
+        )
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=reply_markup)
+            
+    except Exception as e:
+        logger.error(f"Ошибка в show_games_menu: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_guess_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        context.user_data['secret_number'] = random.randint(1, 100)
+        context.user_data['attempts'] = 0
+        user_states[user.id] = GUESSING_NUMBER
+
+        message = (
+            "🎮 Игра 'Угадай число'!\n\n"
+            "Я загадал число от 1 до 100.\n"
+            "Попробуй угадать его!\n\n"
+            "Чтобы отменить игру, отправь /cancel"
+        )
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message)
+        else:
+            await update.message.reply_text(message)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_guess_number: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_rps(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        keyboard = [
+            [
+                InlineKeyboardButton("✊", callback_data="rps_rock"),
+                InlineKeyboardButton("✋", callback_data="rps_paper"),
+                InlineKeyboardButton("✌️", callback_data="rps_scissors")
+            ]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        message = (
+            "🎮 Игра 'Камень-ножницы-бумага'!\n\n"
+            "Выбери свой ход:"
+        )
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_rps: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_rps_choice(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    user_choice = query.data.split("_")[1]
+    choices = ["rock", "paper", "scissors"]
+    bot_choice = random.choice(choices)
+
+    result = determine_rps_winner(user_choice, bot_choice)
+    record_game(user.id, "rps", RPS_POINTS[result])
+
+    emoji_map = {"rock": "✊", "paper": "✋", "scissors": "✌️"}
+    result_message = (
+        f"🎮 Результат игры:\n\n"
+        f"Твой выбор: {emoji_map[user_choice]}\n"
+        f"Мой выбор: {emoji_map[bot_choice]}\n\n"
+        f"Результат: {result}\n\n"
+        f"Чтобы сыграть еще раз, нажми на кнопку '🎮 Игры' или отправь /rps"
+    )
+
+    keyboard = [
+        [
+            InlineKeyboardButton("🎮 Игры", callback_data="games_menu"),
+            InlineKeyboardButton("✊ Сыграть еще раз", callback_data="game_rps")
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.message.edit_text(result_message, reply_markup=reply_markup)
+
+
+async def handle_guess_attempt(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    text = update.message.text
+    try:
+        guess = int(text)
+        context.user_data['attempts'] = context.user_data.get('attempts', 0) + 1
+
+        if guess < context.user_data['secret_number']:
+            await update.message.reply_text("⬆️ Загаданное число больше!")
+        elif guess > context.user_data['secret_number']:
+            await update.message.reply_text("⬇️ Загаданное число меньше!")
+        else:
+            attempts = context.user_data['attempts']
+            record_game(user.id, "guess", max(1, 11 - attempts))
+            keyboard = [
+                [
+                    InlineKeyboardButton("🎮 Игры", callback_data="games_menu"),
+                    InlineKeyboardButton("🎲 Сыграть еще раз", callback_data="game_guess")
+                ]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            await update.message.reply_text(
+                f"🎉 Поздравляю! Ты угадал число за {attempts} попыток!",
+                reply_markup=reply_markup
+            )
+            del user_states[user.id]
+            del context.user_data['secret_number']
+            del context.user_data['attempts']
+    except ValueError:
+        await update.message.reply_text("❌ Пожалуйста, введи число!")
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import re
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+from rates import cached_cross_rate
+
+logger = logging.getLogger(__name__)
+
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+INLINE_DEBOUNCE = float(os.getenv('INLINE_DEBOUNCE', '0.3'))
+DEFAULT_TARGETS = ("USD", "EUR", "RUB", "GBP", "CNY")
+CURRENCY_ALIASES = {
+    "$": "USD", "€": "EUR", "₽": "RUB", "£": "GBP", "¥": "CNY",
+    "РУБ": "RUB", "ДОЛЛАР": "USD", "ЕВРО": "EUR", "ЮАНЬ": "CNY"
+}
+QUERY_PATTERN = re.compile(
+    r"^\s*(\d+(?:[.,]\d+)?)\s*([^\s\d]+)(?:\s+(?:(?:в|in|to)\s+)?([^\s\d]+))?\s*$",
+    re.IGNORECASE
+)
+
+_latest_query = {}
+
+
+def parse_query(query: str):
+    """Parse "100 usd eur", "100usd в eur" or "100 $" into (amount, from, targets)."""
+    match = QUERY_PATTERN.match(query)
+    if not match:
+        return None
+    amount, from_currency, to_currency = match.groups()
+    from_currency = CURRENCY_ALIASES.get(from_currency.upper(), from_currency.upper())
+    if len(from_currency) != 3:
+        return None
+    if to_currency:
+        to_currency = CURRENCY_ALIASES.get(to_currency.upper(), to_currency.upper())
+        if len(to_currency) != 3:
+            return None
+        targets = (to_currency,)
+    else:
+        targets = tuple(currency for currency in DEFAULT_TARGETS if currency != from_currency)
+    return float(amount.replace(',', '.')), from_currency, targets
+
+
+def build_results(amount: float, from_currency: str, targets):
+    results = []
+    for to_currency in targets:
+        found = cached_cross_rate(from_currency, to_currency)
+        if found is None:
+            continue
+        rate, fetched_at = found
+        text = f"{amount:g} {from_currency} = {amount * rate:.2f} {to_currency}"
+        results.append(InlineQueryResultArticle(
+            id=f"{amount:g}{from_currency}{to_currency}",
+            title=text,
+            description=(
+                f"Курс: 1 {from_currency} = {rate:.4f} {to_currency} · "
+                f"данные от {fetched_at.strftime('%d.%m.%Y %H:%M')} UTC"
+            ),
+            input_message_content=InputTextMessageContent(f"💱 {text}\nКурс: 1 {from_currency} = {rate:.4f} {to_currency}")
+        ))
+    return results
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer "@bot 100 usd eur" from the in-memory rate cache.
+
+    Telegram sends a query for every keystroke. Incomplete queries are
+    dropped without an answer, and a complete one is answered only if the
+    user has not typed anything else within INLINE_DEBOUNCE seconds.
+    The handler is registered with block=False, so the wait does not hold
+    up other updates.
+    """
+    inline_query = update.inline_query
+    parsed = parse_query(inline_query.query)
+    if parsed is None:
+        return
+
+    user_id = inline_query.from_user.id
+    _latest_query[user_id] = inline_query.id
+    try:
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        if _latest_query.get(user_id) != inline_query.id:
+            return
+        await inline_query.answer(build_results(*parsed), cache_time=INLINE_CACHE_TIME, is_personal=False)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_inline_query: {e}")
+    finally:
+        if _latest_query.get(user_id) == inline_query.id:
+            del _latest_query[user_id]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from background import start_background_task
+from database import (
+    INVALIDATION_BACKEND,
+    PROCESS_ID,
+    commit_hooks,
+    drop_cached,
+    get_last_invalidation_id,
+    get_invalidations,
+    delete_invalidations
+)
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', '0.05'))
+INVALIDATION_BATCH_SIZE = 1000
+INVALIDATION_RETENTION = int(os.getenv('INVALIDATION_RETENTION', '3600'))
+INVALIDATION_REDIS_URL = os.getenv('INVALIDATION_REDIS_URL', 'redis://localhost:6379/0')
+INVALIDATION_CHANNEL = 'notibot:invalidate'
+
+_subscribers = defaultdict(list)
+
+
+def subscribe(prefix: str, callback, local: bool = True) -> None:
+    """Call `callback(ident)` whenever the key "prefix:ident" changes in any process.
+
+    Keys written by this process are applied right after the commit, unless
+    `local` is False; keys from other processes arrive through the
+    configured backend.
+    """
+    _subscribers[prefix].append((callback, local))
+
+
+def apply(keys, remote: bool = True) -> None:
+    if remote:
+        # Кэши пользователей и меню из database.py; свои изменения они сбрасывают сами.
+        drop_cached(keys)
+    for changed in keys:
+        prefix, _, ident = changed.partition(':')
+        for callback, local in _subscribers.get(prefix, ()):
+            if not (remote or local):
+                continue
+            try:
+                callback(ident)
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе кэша {changed}: {e}")
+
+
+async def _poll_change_log(cursor: int, shard: int) -> None:
+    cleaned_at = datetime.utcnow()
+    while True:
+        try:
+            rows = await asyncio.to_thread(get_invalidations, cursor, INVALIDATION_BATCH_SIZE)
+            if rows:
+                cursor = rows[-1].id
+                await asyncio.to_thread(apply, {row.key for row in rows if row.origin != PROCESS_ID})
+            if shard == 0 and datetime.utcnow() - cleaned_at > timedelta(seconds=INVALIDATION_RETENTION):
+                cleaned_at = datetime.utcnow()
+                deleted = await asyncio.to_thread(delete_invalidations, cleaned_at - timedelta(seconds=INVALIDATION_RETENTION))
+                logger.info(f"Очищен журнал изменений: {deleted} записей")
+            if len(rows) == INVALIDATION_BATCH_SIZE:
+                continue
+        except Exception as e:
+            logger.error(f"Ошибка при чтении журнала изменений: {e}")
+        await asyncio.sleep(INVALIDATION_POLL_INTERVAL)
+
+
+def _redis_publisher():
+    import redis
+    client = redis.Redis.from_url(INVALIDATION_REDIS_URL)
+
+    def publish(keys) -> None:
+        try:
+            client.publish(INVALIDATION_CHANNEL, json.dumps({"origin": PROCESS_ID, "keys": sorted(keys)}))
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать изменения в Redis: {e}")
+
+    return publish
+
+
+async def _listen_redis() -> None:
+    import redis.asyncio
+    while True:
+        client = redis.asyncio.Redis.from_url(INVALIDATION_REDIS_URL)
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload["origin"] != PROCESS_ID:
+                        await asyncio.to_thread(apply, payload["keys"])
+        except Exception as e:
+            logger.error(f"Ошибка подписки на изменения в Redis: {e}")
+        finally:
+            await client.aclose()
+        await asyncio.sleep(1)
+
+
+async def start_invalidation(application, shard: int = 0, shards: int = 1) -> None:
+    commit_hooks.append(lambda keys: apply(keys, remote=False))
+    if INVALIDATION_BACKEND == 'sqlite':
+        # Курсор берётся до запуска цикла: всё, что записано после старта, будет прочитано.
+        cursor = await asyncio.to_thread(get_last_invalidation_id)
+        start_background_task(_poll_change_log(cursor, shard), "invalidation")
+    elif INVALIDATION_BACKEND == 'redis':
+        commit_hooks.append(_redis_publisher())
+        start_background_task(_listen_redis(), "invalidation")
+    logger.info(f"Сброс кэшей между процессами: {INVALIDATION_BACKEND}")
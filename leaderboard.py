@@ -0,0 +1,138 @@
+import logging
+import threading
+from sortedcontainers import SortedList
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database import get_user, get_game_scores, get_user_game_scores, get_usernames, record_game_result
+from invalidation import subscribe
+
+logger = logging.getLogger(__name__)
+
+GAMES = {
+    "all": "🏆 Общий рейтинг",
+    "guess": "🎲 Угадай число",
+    "rps": "✊ Камень-ножницы-бумага",
+    "quiz": "❓ Викторина"
+}
+TOP_SIZE = 10
+
+
+class Leaderboard:
+    """Ranking kept sorted on every update so top-N and rank lookups are O(log n)."""
+
+    def __init__(self):
+        self._scores = {}
+        self._ranking = SortedList()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set_score(self, user_id: int, score: int) -> None:
+        with self._lock:
+            old_score = self._scores.get(user_id)
+            if old_score is not None:
+                self._ranking.remove((-old_score, user_id))
+            self._scores[user_id] = score
+            self._ranking.add((-score, user_id))
+
+    def top(self, limit: int):
+        with self._lock:
+            return [(user_id, -score) for score, user_id in self._ranking.islice(0, limit)]
+
+    def rank(self, user_id: int):
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return self._ranking.bisect_left((-score,)) + 1, score
+
+
+_leaderboards = None
+
+
+def get_leaderboards():
+    global _leaderboards
+    if _leaderboards is None:
+        leaderboards = {game: Leaderboard() for game in GAMES}
+        for game, user_id, total in get_game_scores():
+            leaderboards.setdefault(game, Leaderboard()).set_score(user_id, total)
+        _leaderboards = leaderboards
+    return _leaderboards
+
+
+def reload_user_scores(user_id: str) -> None:
+    """Pick up a user's totals changed by a game played on another shard."""
+    if _leaderboards is None:
+        return
+    for game, total in get_user_game_scores(int(user_id)):
+        _leaderboards.setdefault(game, Leaderboard()).set_score(int(user_id), total)
+
+
+# Ключ на пользователя: результат игры на другом шарде стоит чтения двух
+# строк, а не перезагрузки всего рейтинга.
+subscribe("game_scores", reload_user_scores, local=False)
+
+
+def record_game(user_id: int, game: str, points: int) -> None:
+    try:
+        totals = record_game_result(user_id, game, points)
+        leaderboards = get_leaderboards()
+        for key, total in totals.items():
+            leaderboards[key].set_score(user_id, total)
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении рейтинга: {e}")
+
+
+async def handle_top(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        if update.callback_query:
+            game = update.callback_query.data.split("_", 1)[1]
+        else:
+            game = context.args[0].lower() if context.args else "all"
+        if game not in GAMES:
+            await update.message.reply_text(
+                "❌ Неизвестная игра.\n"
+                f"Доступно: {', '.join(GAMES)}\n"
+                "Пример: /top quiz"
+            )
+            return
+
+        leaderboard = get_leaderboards()[game]
+        top = leaderboard.top(TOP_SIZE)
+        names = get_usernames([user_id for user_id, _ in top]) if top else {}
+
+        message = f"{GAMES[game]}\n\n"
+        if not top:
+            message += "Пока никто не играл. Будь первым! 🚀\n"
+        for position, (user_id, score) in enumerate(top, start=1):
+            message += f"{position}. {names.get(user_id) or 'Игрок'} - {score}\n"
+
+        my_rank = leaderboard.rank(user.id)
+        if my_rank:
+            message += f"\n📍 Твоё место: {my_rank[0]} из {len(leaderboard)} ({my_rank[1]} очков)"
+        else:
+            message += "\n📍 Ты пока не в рейтинге этой игры"
+
+        keyboard = [
+            [InlineKeyboardButton(title, callback_data=f"top_{key}")]
+            for key, title in GAMES.items() if key != game
+        ]
+        keyboard.append([InlineKeyboardButton("🎮 Игры", callback_data="games_menu")])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_top: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
@@ -0,0 +1,197 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from telegram import Update
+from telegram.ext import SimpleUpdateProcessor
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_FILE = os.getenv('LOG_FILE')
+# "httpx=0.05,database=0.1": доля записей ниже WARNING, которые сохраняются.
+LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+# Не больше стольких записей в секунду от одного логгера, 0 — без ограничения.
+LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', '50'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+current_update = contextvars.ContextVar('current_update', default=None)
+_listener = None
+
+
+def parse_sampling(value: str) -> dict:
+    rates = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Drops records before they are queued, so dropped records cost almost nothing.
+
+    Records below WARNING from loggers listed in LOG_SAMPLING are kept with
+    the given probability (a logger inherits its parent's rate). Every logger
+    is also limited to LOG_RATE_LIMIT records per second with a token bucket;
+    the number of records dropped this way is attached to the next one let
+    through as `dropped`. ERROR and CRITICAL records are never rate limited.
+    """
+
+    def __init__(self, sampling: dict, rate_limit: float):
+        super().__init__()
+        self.sampling = sampling
+        self.rate_limit = rate_limit
+        self._sample_rates = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _sample_rate(self, name: str) -> float:
+        rate = self._sample_rates.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split('.')
+            for end in range(len(parts), 0, -1):
+                prefix = '.'.join(parts[:end])
+                if prefix in self.sampling:
+                    rate = self.sampling[prefix]
+                    break
+            self._sample_rates[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and random.random() >= self._sample_rate(record.name):
+            return False
+        if not self.rate_limit or record.levelno >= logging.ERROR:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, dropped = self._buckets.get(record.name, (self.rate_limit, now, 0))
+            tokens = min(self.rate_limit, tokens + (now - updated_at) * self.rate_limit)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+        if dropped:
+            record.dropped = dropped
+        return True
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them on the calling thread.
+
+    The stock QueueHandler renders the message before queueing it; here the
+    message and its arguments are left for the listener thread, and only the
+    update that is being handled is captured.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = current_update.get()
+        if context is not None:
+            record.update_id, record.user_id, record.chat_id = context
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    FIELDS = ('update_id', 'user_id', 'chat_id', 'shard', 'dropped')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ShardFilter(logging.Filter):
+    def __init__(self, shard: int):
+        super().__init__()
+        self.shard = shard
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.shard = self.shard
+        return True
+
+
+def setup_logging(shard=None) -> None:
+    """Route every log record through a queue to a background writer thread.
+
+    Safe to call more than once; only the first call in a process has effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    elif shard is not None:
+        formatter = logging.Formatter(f'%(asctime)s - shard {shard} - %(name)s - %(levelname)s - %(message)s')
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE.format(shard=shard if shard is not None else 0), encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING), LOG_RATE_LIMIT))
+    if shard is not None:
+        queue_handler.addFilter(ShardFilter(shard))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class BoundUpdateProcessor(SimpleUpdateProcessor):
+    """Attaches the update being handled to every record logged while handling it.
+
+    The binding is reset once the update is processed, so records logged
+    afterwards by the same task are not tagged with a finished update.
+    """
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if not isinstance(update, Update):
+            await coroutine
+            return
+        token = current_update.set((
+            update.update_id,
+            update.effective_user.id if update.effective_user else None,
+            update.effective_chat.id if update.effective_chat else None
+        ))
+        try:
+            await coroutine
+        finally:
+            current_update.reset(token)
@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import re
+import zlib
+from difflib import SequenceMatcher
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from database import (
+    get_note,
+    get_note_versions,
+    get_note_revision_chain,
+    save_note_edit,
+    get_notes,
+    get_tags,
+    get_tag,
+    get_folders,
+    get_folder,
+    create_folder,
+    move_note
+)
+from states import EDITING_NOTE, WAITING_FOR_FOLDER_NAME, user_states
+
+logger = logging.getLogger(__name__)
+
+NOTE_SNAPSHOT_INTERVAL = 10
+HISTORY_VERSIONS_SHOWN = 10
+TOKEN_PATTERN = re.compile(r'(\s+)')
+TAG_PATTERN = re.compile(r'#(\w+)')
+MAX_TAGS_PER_NOTE = 20
+MAX_TAG_LENGTH = 64
+MAX_FOLDER_NAME_LENGTH = 64
+
+
+def parse_tags(text: str):
+    """Return the note's #hashtags, lowercased and deduplicated, in order of appearance."""
+    tags = []
+    for tag in TAG_PATTERN.findall(text):
+        tag = tag.lower()[:MAX_TAG_LENGTH]
+        if tag not in tags:
+            tags.append(tag)
+    return tags[:MAX_TAGS_PER_NOTE]
+
+
+def make_delta(old: str, new: str) -> bytes:
+    """Encode `new` as word-level edits of `old`: a list of [start, end, replacement]."""
+    old_tokens = TOKEN_PATTERN.split(old)
+    new_tokens = TOKEN_PATTERN.split(new)
+    edits = [
+        [i1, i2, "".join(new_tokens[j1:j2])]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_tokens, new_tokens, autojunk=False).get_opcodes()
+        if tag != 'equal'
+    ]
+    return zlib.compress(json.dumps(edits, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def apply_delta(old: str, delta: bytes) -> str:
+    tokens = TOKEN_PATTERN.split(old)
+    parts = []
+    position = 0
+    for start, end, replacement in json.loads(zlib.decompress(delta)):
+        parts.extend(tokens[position:start])
+        parts.append(replacement)
+        position = end
+    parts.extend(tokens[position:])
+    return "".join(parts)
+
+
+def make_snapshot(content: str) -> bytes:
+    return zlib.compress(content.encode())
+
+
+def build_revision(version: int, old: str, new: str):
+    """Return (version, is_snapshot, data) for a new revision.
+
+    Every NOTE_SNAPSHOT_INTERVAL-th version is a full snapshot, so rebuilding
+    any version applies fewer than NOTE_SNAPSHOT_INTERVAL deltas. A delta that
+    would be larger than the snapshot is stored as a snapshot instead.
+    """
+    snapshot = make_snapshot(new)
+    if (version - 1) % NOTE_SNAPSHOT_INTERVAL == 0:
+        return version, True, snapshot
+    delta = make_delta(old, new)
+    if len(delta) >= len(snapshot):
+        return version, True, snapshot
+    return version, False, delta
+
+
+def rebuild_version(note_id: int, version: int):
+    chain = get_note_revision_chain(note_id, version)
+    if not chain or chain[-1].version != version:
+        return None
+    content = zlib.decompress(chain[0].data).decode()
+    for revision in chain[1:]:
+        content = zlib.decompress(revision.data).decode() if revision.is_snapshot else apply_delta(content, revision.data)
+    return content
+
+
+def edit_note(note_id: int, user_id: int, content: str):
+    """Save `content` as the next version of a note; return that version or None."""
+    note = get_note(note_id, user_id)
+    if note is None:
+        return None
+    versions = get_note_versions(note_id)
+    revisions = []
+    if versions:
+        version = versions[-1].version + 1
+    else:
+        # Заметки, созданные до появления истории, получают исходную версию при первой правке.
+        revisions.append((1, True, make_snapshot(note.content)))
+        version = 2
+    revisions.append(build_revision(version, note.content, content))
+    if not save_note_edit(note_id, user_id, content, revisions, parse_tags(content)):
+        return None
+    return version
+
+
+async def start_note_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    note = get_note(int(query.data.split("_")[2]), user.id)
+    if note is None:
+        await query.message.reply_text("❌ Заметка не найдена.")
+        return
+    context.user_data['note_id_for_edit'] = note.id
+    user_states[user.id] = EDITING_NOTE
+    await query.message.reply_text(
+        f"✏️ Текущий текст заметки:\n\n{note.content}\n\n"
+        "Отправь новый текст заметки.\n"
+        "Чтобы отменить изменение, отправь /cancel"
+    )
+
+
+async def handle_note_edit_text(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    text = update.message.text
+    if not text:
+        await update.message.reply_text("❌ Заметка не может быть пустой. Попробуйте еще раз.")
+        return
+
+    note_id = context.user_data.pop('note_id_for_edit', None)
+    del user_states[user.id]
+    version = await asyncio.to_thread(edit_note, note_id, user.id, text) if note_id else None
+    if version is None:
+        await update.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    keyboard = [[
+        InlineKeyboardButton("🕘 История", callback_data=f"note_history_{note_id}"),
+        InlineKeyboardButton("🔙 Назад", callback_data="list_notes")
+    ]]
+    await update.message.reply_text(
+        f"✅ Заметка обновлена (версия {version}).",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def show_note_history(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    note = get_note(int(query.data.split("_")[2]), user.id)
+    if note is None:
+        await query.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    versions = get_note_versions(note.id)
+    if len(versions) < 2:
+        await query.message.reply_text("🕘 Эта заметка ещё не изменялась.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"Версия {revision.version} · {revision.created_at.strftime('%d.%m.%Y %H:%M')}",
+            callback_data=f"note_version_{note.id}_{revision.version}"
+        )]
+        for revision in reversed(versions[-HISTORY_VERSIONS_SHOWN:])
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Назад к заметкам", callback_data="list_notes")])
+    await query.message.reply_text(
+        f"🕘 История заметки (версий: {len(versions)}):",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def show_note_version(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    _, _, note_id, version = query.data.split("_")
+    note = get_note(int(note_id), user.id)
+    content = await asyncio.to_thread(rebuild_version, note.id, int(version)) if note else None
+    if content is None:
+        await query.message.reply_text("❌ Версия не найдена.")
+        return
+
+    keyboard = [[
+        InlineKeyboardButton("↩️ Восстановить", callback_data=f"note_restore_{note.id}_{version}"),
+        InlineKeyboardButton("🔙 К истории", callback_data=f"note_history_{note.id}")
+    ]]
+    await query.message.reply_text(
+        f"🕘 Версия {version}:\n\n{content}",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def restore_note_version(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    _, _, note_id, version = query.data.split("_")
+    content = await asyncio.to_thread(rebuild_version, int(note_id), int(version))
+    new_version = await asyncio.to_thread(edit_note, int(note_id), user.id, content) if content is not None else None
+    if new_version is None:
+        await query.message.reply_text("❌ Версия не найдена.")
+        return
+    await query.message.reply_text(f"✅ Восстановлена версия {version} (новая версия {new_version}).")
+
+
+async def send_notes(message, notes, back_callback="notes") -> None:
+    """Send one message per note with its action buttons, then a back button."""
+    for note in notes:
+        buttons = [
+            InlineKeyboardButton("✏️ Изменить", callback_data=f"edit_note_{note.id}"),
+            InlineKeyboardButton("❌ Удалить", callback_data=f"delete_note_{note.id}")
+        ]
+        if note.images:
+            buttons.insert(0, InlineKeyboardButton("📷 Открыть изображение", callback_data=f"show_image_{note.id}"))
+        else:
+            buttons.insert(0, InlineKeyboardButton("➕ Добавить изображение", callback_data=f"add_image_{note.id}"))
+        more = [
+            InlineKeyboardButton("🕘 История", callback_data=f"note_history_{note.id}"),
+            InlineKeyboardButton("📁 В папку", callback_data=f"note_folder_{note.id}")
+        ]
+        text = f"• {note.content}\n📅 {note.created_at.strftime('%d.%m.%Y %H:%M')}"
+        await message.reply_text(text, reply_markup=InlineKeyboardMarkup([buttons, more]))
+
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=back_callback)]]
+    await message.reply_text("Выбери заметку:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def show_tags(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    tags = get_tags(user.id)
+    keyboard = [
+        [InlineKeyboardButton(f"#{tag.name} ({tag.note_count})", callback_data=f"tag_{tag.id}")]
+        for tag in tags
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="notes")])
+    message = "🏷 Твои теги:" if tags else "🏷 Тегов пока нет. Добавь #тег в текст заметки."
+    await update.callback_query.message.edit_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def show_tag_notes(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    tag = get_tag(int(query.data.split("_")[1]), user.id)
+    notes = get_notes(user.id, tag_id=tag.id) if tag else []
+    if not notes:
+        await query.message.edit_text(
+            "🏷 Заметок с этим тегом нет.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="tags_menu")]])
+        )
+        return
+    await query.message.edit_text(f"🏷 Заметки с тегом #{tag.name}:")
+    await send_notes(query.message, notes, "tags_menu")
+
+
+async def show_folders(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    folders = get_folders(user.id)
+    keyboard = [
+        [InlineKeyboardButton(f"📁 {folder.name} ({folder.note_count})", callback_data=f"folder_{folder.id}")]
+        for folder in folders
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="notes")])
+    message = "📁 Твои папки:" if folders else "📁 Папок пока нет. Создай папку кнопкой «📁 В папку» у заметки."
+    await update.callback_query.message.edit_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def show_folder_notes(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    folder = get_folder(int(query.data.split("_")[1]), user.id)
+    notes = get_notes(user.id, folder_id=folder.id) if folder else []
+    if not notes:
+        await query.message.edit_text(
+            "📁 В этой папке нет заметок.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="folders_menu")]])
+        )
+        return
+    await query.message.edit_text(f"📁 Папка {folder.name}:")
+    await send_notes(query.message, notes, "folders_menu")
+
+
+async def choose_note_folder(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    note_id = int(query.data.split("_")[2])
+    keyboard = [
+        [InlineKeyboardButton(f"📁 {folder.name}", callback_data=f"move_note_{note_id}_{folder.id}")]
+        for folder in get_folders(user.id)
+    ]
+    keyboard.append([InlineKeyboardButton("➕ Новая папка", callback_data=f"new_folder_{note_id}")])
+    keyboard.append([InlineKeyboardButton("🚫 Без папки", callback_data=f"move_note_{note_id}_0")])
+    await query.message.reply_text("📁 Куда переместить заметку?", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def handle_move_note(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    _, _, note_id, folder_id = query.data.split("_")
+    if move_note(int(note_id), user.id, int(folder_id) or None):
+        await query.message.edit_text("✅ Заметка перемещена.")
+    else:
+        await query.message.edit_text("❌ Заметка или папка не найдена.")
+
+
+async def start_folder_create(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    context.user_data['note_id_for_folder'] = int(query.data.split("_")[2])
+    user_states[user.id] = WAITING_FOR_FOLDER_NAME
+    await query.message.edit_text(
+        "📁 Введи название новой папки:\n\n"
+        "Чтобы отменить, отправь /cancel"
+    )
+
+
+async def handle_folder_name_text(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    name = (update.message.text or "").strip()
+    if not name or len(name) > MAX_FOLDER_NAME_LENGTH:
+        await update.message.reply_text(f"❌ Название папки должно быть от 1 до {MAX_FOLDER_NAME_LENGTH} символов.")
+        return
+
+    note_id = context.user_data.pop('note_id_for_folder', None)
+    del user_states[user.id]
+    folder_id = create_folder(user.id, name)
+    if note_id is None or not move_note(note_id, user.id, folder_id):
+        await update.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    keyboard = [[InlineKeyboardButton("📁 К папкам", callback_data="folders_menu")]]
+    await update.message.reply_text(
+        f"✅ Заметка перемещена в папку {name}.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
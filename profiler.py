@@ -0,0 +1,207 @@
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from admin import is_admin
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = 300
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_TOP = 40
+TRACEMALLOC_FRAMES = 10
+
+_sampling = threading.Event()
+_baseline = None
+
+
+class StackSampler(threading.Thread):
+    """Counts the Python stacks of every thread every PROFILE_SAMPLE_INTERVAL seconds.
+
+    Nothing is hooked into the interpreter, so the profiled code runs at full
+    speed; the cost is one sys._current_frames() walk per sample on this
+    thread. Stacks are kept in the folded format that flamegraph.pl and
+    speedscope read.
+    """
+
+    def __init__(self, seconds: float):
+        super().__init__(name="profiler", daemon=True)
+        self.seconds = seconds
+        self.samples = 0
+        self.stacks = Counter()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+
+    def top_functions(self):
+        """(function, samples on top of stack, samples anywhere in stack) by self time."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(frame, count, total[frame]) for frame, count in own.most_common(PROFILE_TOP)]
+
+
+def _output_path(kind: str, extension: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+
+def _write_cpu_profile(sampler: StackSampler):
+    folded = _output_path("cpu", "folded")
+    with open(folded, "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    summary = _output_path("cpu", "txt")
+    with open(summary, "w") as f:
+        f.write(f"Samples: {sampler.samples}, interval {PROFILE_SAMPLE_INTERVAL * 1000:.1f} ms\n\n")
+        f.write(f"{'self':>8} {'total':>8}  function\n")
+        for frame, own, total in sampler.top_functions():
+            f.write(f"{own:>8} {total:>8}  {frame}\n")
+    return summary, folded
+
+
+def _memory_diff():
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    path = _output_path("memory", "txt")
+    with open(path, "w") as f:
+        f.write(f"Traced: {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB\n\n")
+        f.write("Top allocations since the baseline:\n")
+        for stat in snapshot.compare_to(_baseline, 'lineno')[:PROFILE_TOP]:
+            f.write(f"{stat}\n")
+        f.write("\nLargest allocation sites, full traceback:\n")
+        for stat in snapshot.statistics('traceback')[:5]:
+            f.write(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+            f.write("\n".join(stat.traceback.format()) + "\n")
+    return path
+
+
+def _dump_tasks() -> str:
+    buffer = io.StringIO()
+    tasks = asyncio.all_tasks()
+    buffer.write(f"Tasks: {len(tasks)}\n")
+    for task in sorted(tasks, key=lambda task: task.get_name()):
+        buffer.write(f"\n=== {task.get_name()} ===\n")
+        task.print_stack(file=buffer)
+    path = _output_path("tasks", "txt")
+    with open(path, "w") as f:
+        f.write(buffer.getvalue())
+    return path
+
+
+async def _send_files(update: Update, paths) -> None:
+    for path in paths:
+        with open(path, "rb") as f:
+            await update.effective_message.reply_document(f, filename=os.path.basename(path))
+
+
+async def _profile_cpu(update: Update, seconds: float) -> None:
+    sampler = StackSampler(seconds)
+    sampler.start()
+    try:
+        await asyncio.to_thread(sampler.join)
+        paths = await asyncio.to_thread(_write_cpu_profile, sampler)
+        await update.effective_message.reply_text(f"✅ Профилирование завершено, сэмплов: {sampler.samples}")
+        await _send_files(update, paths)
+    except Exception as e:
+        logger.error(f"Ошибка при профилировании: {e}")
+    finally:
+        _sampling.clear()
+
+
+async def handle_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/profile cpu [секунды] | mem start | mem diff | mem stop | tasks"""
+    global _baseline
+    try:
+        if not is_admin(update):
+            await update.message.reply_text("❌ Команда доступна только администраторам.")
+            return
+
+        args = [arg.lower() for arg in context.args or []]
+        if args and args[0] == "cpu":
+            if _sampling.is_set():
+                await update.message.reply_text("⏳ Профилирование уже идёт.")
+                return
+            seconds = PROFILE_DEFAULT_SECONDS
+            if len(args) > 1 and args[1].isdigit():
+                seconds = max(1, min(int(args[1]), PROFILE_MAX_SECONDS))
+            _sampling.set()
+            # Ответ не ждёт окончания замера, чтобы не держать очередь обновлений.
+            context.application.create_task(_profile_cpu(update, seconds), update=update)
+            await update.message.reply_text(f"⏱ Профилирую {seconds} с, результаты пришлю файлами.")
+            return
+
+        if args[:2] == ["mem", "start"]:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            _baseline = tracemalloc.take_snapshot()
+            await update.message.reply_text(
+                "📸 Отслеживание памяти включено, базовый снимок сохранён.\n"
+                "Сравнить с ним: /profile mem diff"
+            )
+            return
+
+        if args[:2] == ["mem", "diff"]:
+            if _baseline is None or not tracemalloc.is_tracing():
+                await update.message.reply_text("❌ Сначала включи отслеживание: /profile mem start")
+                return
+            path = await asyncio.to_thread(_memory_diff)
+            await _send_files(update, [path])
+            return
+
+        if args[:2] == ["mem", "stop"]:
+            tracemalloc.stop()
+            _baseline = None
+            await update.message.reply_text("✅ Отслеживание памяти выключено.")
+            return
+
+        if args[:1] == ["tasks"]:
+            await _send_files(update, [_dump_tasks()])
+            return
+
+        await update.message.reply_text(
+            "🩺 Профилирование\n\n"
+            "/profile cpu [секунды] — сэмплирующий профилировщик\n"
+            "/profile mem start — включить tracemalloc и сохранить снимок\n"
+            "/profile mem diff — что выделено с момента снимка\n"
+            "/profile mem stop — выключить tracemalloc\n"
+            "/profile tasks — стеки всех asyncio-задач\n\n"
+            f"Файлы сохраняются в {PROFILE_DIR}/"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в handle_profile: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
@@ -0,0 +1,142 @@
+"""Time the queries behind the hot handlers and check their SQLite query plans.
+
+    python query_plans.py [--user-id ID] [--runs 5]
+
+Each case calls the database.py function its handler calls and records the
+SELECT statements it sends, so the checked SQL is always the SQL the bot
+runs. The script exits with status 1 if any plan contains a full table
+scan, so it can run in CI against a database filled by seed.py.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import event, func
+from database import (
+    engine,
+    Session,
+    User,
+    user_cache,
+    menu_cache,
+    get_user,
+    get_notes,
+    get_goals,
+    get_note_image,
+    get_user_stats,
+    get_tags,
+    get_folders,
+    get_selectable_items,
+    get_expired_messages,
+    purge_deleted
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Обработчик -> вызов функции из database.py; sample — id заметки с картинкой и тега.
+CASES = {
+    "get_user": lambda user, sample: get_user(user.telegram_id),
+    "list_notes": lambda user, sample: get_notes(user.id),
+    "list_goals": lambda user, sample: get_goals(user.id),
+    "show_image_": lambda user, sample: get_note_image(sample["note_id"], user.id),
+    "handle_stats": lambda user, sample: get_user_stats(user.id),
+    "tags menu": lambda user, sample: get_tags(user.id),
+    "notes by tag": lambda user, sample: get_notes(user.id, tag_id=sample["tag_id"]),
+    "folders menu": lambda user, sample: get_folders(user.id),
+    "select notes": lambda user, sample: get_selectable_items('notes', user.id),
+    # Граница в прошлом: запрос выполняется, но удалять нечего.
+    "purge notes": lambda user, sample: purge_deleted('notes', EPOCH, 200),
+    "retention": lambda user, sample: get_expired_messages(datetime.utcnow(), 200),
+}
+
+
+def full_scans(plan):
+    """Plan lines that read a whole table rather than searching an index."""
+    return [line for line in plan if line.startswith("SCAN ") and "USING" not in line]
+
+
+def sample_ids(user) -> dict:
+    notes = get_notes(user.id)
+    tags = get_tags(user.id)
+    return {
+        "note_id": next((note.id for note in notes if note.images), 0),
+        "tag_id": tags[0].id if tags else 0,
+    }
+
+
+def run_case(build, user, sample):
+    """Call one case with cold caches; returns the SELECT statements it ran and the time in ms."""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    user_cache.clear()
+    menu_cache.clear()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        started = time.perf_counter()
+        build(user, sample)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements, elapsed
+
+
+def explain(statement, parameters):
+    with engine.connect() as connection:
+        return [row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+def collect_plans(user, runs: int = 1) -> dict:
+    """{case: (median ms, [plan lines of each statement])} for every case in CASES."""
+    sample = sample_ids(user)
+    results = {}
+    for name, build in CASES.items():
+        timings = []
+        for _ in range(runs):
+            statements, elapsed = run_case(build, user, sample)
+            timings.append(elapsed)
+        plans = [explain(statement, parameters) for statement, parameters in statements]
+        results[name] = (statistics.median(timings), plans)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверить планы запросов основных обработчиков")
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    if engine.dialect.name != 'sqlite':
+        print("Планы запросов проверяются только для SQLite")
+        return 1
+
+    session = Session()
+    try:
+        if args.user_id is not None:
+            user = session.get(User, args.user_id)
+        else:
+            total = session.query(func.count(User.id)).scalar()
+            user = session.query(User).order_by(User.id).offset(total // 2).first()
+    finally:
+        session.close()
+    if user is None:
+        print("Пользователь не найден: заполните базу через seed.py")
+        return 1
+
+    failed = False
+    for name, (median, plans) in collect_plans(user, args.runs).items():
+        print(f"{name:<24} {median:9.2f} мс")
+        for plan in plans:
+            for line in plan:
+                print(f"    {line}")
+            if full_scans(plan):
+                print("    ^ ПОЛНЫЙ ПРОСМОТР ТАБЛИЦЫ")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from cache import TTLCache
+from database import get_user, get_quiz_progress, save_quiz_result
+from leaderboard import record_game
+from states import PLAYING_QUIZ, user_states
+
+logger = logging.getLogger(__name__)
+
+QUIZ_BANK_PATH = os.getenv('QUIZ_BANK_PATH')
+QUIZ_ROUND_SIZE = int(os.getenv('QUIZ_ROUND_SIZE', '5'))
+MAX_RANDOM_PROBES = 8
+# Прогресс хранится в базе; в памяти держатся только недавние игроки.
+QUIZ_PROGRESS_CACHE_SIZE = int(os.getenv('QUIZ_PROGRESS_CACHE_SIZE', '10000'))
+QUIZ_PROGRESS_TTL = int(os.getenv('QUIZ_PROGRESS_TTL', '3600'))
+
+QUIZ_QUESTIONS = [
+    {
+        "question": "Какая планета самая большая в Солнечной системе?",
+        "options": ["Марс", "Юпитер", "Сатурн", "Земля"],
+        "correct": 1
+    },
+    {
+        "question": "Сколько континентов на Земле?",
+        "options": ["5", "6", "7", "8"],
+        "correct": 2
+    },
+    {
+        "question": "Какое животное является символом России?",
+        "options": ["Медведь", "Орел", "Волк", "Тигр"],
+        "correct": 0
+    }
+]
+
+DEFAULT_CATEGORY = "общие"
+DEFAULT_DIFFICULTY = "легко"
+
+
+class QuizQuestion:
+    __slots__ = ('index', 'question', 'options', 'correct', 'category', 'difficulty', 'reply_markup')
+
+    def __init__(self, index, question, options, correct, category, difficulty):
+        self.index = index
+        self.question = question
+        self.options = options
+        self.correct = correct
+        self.category = category
+        self.difficulty = difficulty
+        self.reply_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(option, callback_data=f"quiz_{i}")] for i, option in enumerate(options)]
+        )
+
+
+class QuestionBank:
+    """Question bank indexed by category and difficulty.
+
+    Seen questions are tracked per user in a bitmap where bit N stands for the
+    question with index N, so progress costs one bit per question.
+    """
+
+    def __init__(self, questions):
+        self.questions = []
+        self.pools = {}
+        for raw in questions:
+            question = QuizQuestion(
+                index=len(self.questions),
+                question=raw['question'],
+                options=list(raw['options']),
+                correct=int(raw['correct']),
+                category=(raw.get('category') or DEFAULT_CATEGORY).lower(),
+                difficulty=(raw.get('difficulty') or DEFAULT_DIFFICULTY).lower()
+            )
+            self.questions.append(question)
+            for key in (
+                (None, None),
+                (question.category, None),
+                (None, question.difficulty),
+                (question.category, question.difficulty)
+            ):
+                self.pools.setdefault(key, []).append(question.index)
+
+    @classmethod
+    def from_file(cls, path):
+        if path.endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                return cls(json.load(f))
+
+        connection = sqlite3.connect(path)
+        try:
+            rows = connection.execute(
+                "SELECT question, options, correct, category, difficulty FROM questions ORDER BY id"
+            ).fetchall()
+        finally:
+            connection.close()
+        return cls(
+            {
+                'question': question,
+                'options': json.loads(options),
+                'correct': correct,
+                'category': category,
+                'difficulty': difficulty
+            }
+            for question, options, correct, category, difficulty in rows
+        )
+
+    @property
+    def categories(self):
+        return sorted(category for category, difficulty in self.pools if category and difficulty is None)
+
+    @property
+    def difficulties(self):
+        return sorted(difficulty for category, difficulty in self.pools if difficulty and category is None)
+
+    def pool_size(self, category=None, difficulty=None):
+        return len(self.pools.get((category, difficulty), ()))
+
+    def ensure_capacity(self, seen: bytearray) -> bytearray:
+        missing = (len(self.questions) + 7) // 8 - len(seen)
+        if missing > 0:
+            seen.extend(bytes(missing))
+        return seen
+
+    def draw(self, seen: bytearray, category=None, difficulty=None):
+        pool = self.pools.get((category, difficulty))
+        if not pool:
+            return None
+
+        # Пока большая часть пула не пройдена, случайная проба почти всегда
+        # попадает в новый вопрос, и выбор занимает O(1).
+        for _ in range(MAX_RANDOM_PROBES):
+            index = random.choice(pool)
+            if not seen[index >> 3] & (1 << (index & 7)):
+                break
+        else:
+            unseen = [i for i in pool if not seen[i >> 3] & (1 << (i & 7))]
+            if not unseen:
+                for i in pool:
+                    seen[i >> 3] &= ~(1 << (i & 7))
+                unseen = pool
+            index = random.choice(unseen)
+
+        seen[index >> 3] |= 1 << (index & 7)
+        return self.questions[index]
+
+
+_question_bank = None
+_seen_questions = TTLCache(QUIZ_PROGRESS_CACHE_SIZE, QUIZ_PROGRESS_TTL)
+
+
+def get_question_bank() -> QuestionBank:
+    global _question_bank
+    if _question_bank is None:
+        if QUIZ_BANK_PATH:
+            _question_bank = QuestionBank.from_file(QUIZ_BANK_PATH)
+            logger.info("Загружено вопросов викторины: %s из %s", len(_question_bank.questions), QUIZ_BANK_PATH)
+        else:
+            _question_bank = QuestionBank(QUIZ_QUESTIONS)
+    return _question_bank
+
+
+async def load_question_bank() -> QuestionBank:
+    """The question bank; the first load reads QUIZ_BANK_PATH in a worker thread."""
+    if _question_bank is not None:
+        return _question_bank
+    return await asyncio.to_thread(get_question_bank)
+
+
+def get_seen_questions(user_id: int) -> bytearray:
+    seen = _seen_questions.get(user_id)
+    if seen is None:
+        seen = get_quiz_progress(user_id)
+    # Запись обновляется при каждом обращении, чтобы не истечь посреди раунда.
+    _seen_questions.set(user_id, seen)
+    return get_question_bank().ensure_capacity(seen)
+
+
+async def show_quiz_question(update: Update, context: ContextTypes.DEFAULT_TYPE, user, result: str = "") -> None:
+    try:
+        bank = get_question_bank()
+        current_question = context.user_data.get('current_question', 0)
+        total = context.user_data.get('quiz_total', 0)
+        category = context.user_data.get('quiz_category')
+        difficulty = context.user_data.get('quiz_difficulty')
+
+        if current_question >= total:
+            score = context.user_data.get('quiz_score', 0)
+
+            if user.id in user_states:
+                del user_states[user.id]
+            context.user_data.pop('quiz_question_id', None)
+
+            save_quiz_result(user.id, get_seen_questions(user.id), category, difficulty, score, total)
+            record_game(user.id, "quiz", score)
+
+            keyboard = [
+                [
+                    InlineKeyboardButton("🎮 Игры", callback_data="games_menu"),
+                    InlineKeyboardButton("❓ Сыграть еще раз", callback_data="game_quiz")
+                ]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            message = (
+                f"{result}"
+                f"🎉 Викторина завершена!\n\n"
+                f"Твой результат: {score} из {total} правильных ответов!\n\n"
+                f"Чтобы сыграть еще раз, нажми на кнопку ниже или отправь /quiz"
+            )
+
+            if update.callback_query:
+                await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+            else:
+                await update.message.reply_text(message, reply_markup=reply_markup)
+            return
+
+        question = bank.draw(get_seen_questions(user.id), category, difficulty)
+        context.user_data['quiz_question_id'] = question.index
+
+        message = (
+            f"{result}"
+            f"❓ Вопрос {current_question + 1} из {total}:\n\n"
+            f"{question.question}"
+        )
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=question.reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=question.reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка в show_quiz_question: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        bank = await load_question_bank()
+        if not bank.questions:
+            await update.effective_message.reply_text("❌ Вопросы для викторины пока не загружены.")
+            return
+
+        args = [arg.lower() for arg in context.args] if context.args else []
+        category = next((arg for arg in args if arg in bank.categories), None)
+        difficulty = next((arg for arg in args if arg in bank.difficulties), None)
+
+        pool_size = bank.pool_size(category, difficulty)
+        if not pool_size or len(args) != (category is not None) + (difficulty is not None):
+            await update.message.reply_text(
+                "❌ Нет вопросов для выбранных параметров.\n\n"
+                f"Категории: {', '.join(bank.categories)}\n"
+                f"Сложность: {', '.join(bank.difficulties)}\n\n"
+                "Пример: /quiz " + " ".join(filter(None, [bank.categories[0], bank.difficulties[0]]))
+            )
+            return
+
+        context.user_data['quiz_score'] = 0
+        context.user_data['current_question'] = 0
+        context.user_data['quiz_total'] = min(QUIZ_ROUND_SIZE, pool_size)
+        context.user_data['quiz_category'] = category
+        context.user_data['quiz_difficulty'] = difficulty
+        user_states[user.id] = PLAYING_QUIZ
+
+        await show_quiz_question(update, context, user)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_quiz: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    question_id = context.user_data.get('quiz_question_id')
+    if user_states.get(user.id) != PLAYING_QUIZ or question_id is None:
+        await query.message.edit_text("❌ Викторина не активна. Начни новую командой /quiz")
+        return
+
+    question = get_question_bank().questions[question_id]
+    answer = int(query.data.split("_")[1])
+
+    if answer == question.correct:
+        context.user_data['quiz_score'] = context.user_data.get('quiz_score', 0) + 1
+        result = "✅ Правильно!"
+    else:
+        result = "❌ Неверно!"
+
+    context.user_data['current_question'] = context.user_data.get('current_question', 0) + 1
+    await show_quiz_question(
+        update,
+        context,
+        user,
+        f"{result}\nПравильный ответ: {question.options[question.correct]}\n\n"
+    )
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from database import (
+    get_latest_rate_snapshots,
+    get_latest_rate_snapshot,
+    get_rate_snapshot_index,
+    get_rate_snapshot_payloads,
+    save_rate_snapshot
+)
+from invalidation import subscribe
+
+logger = logging.getLogger(__name__)
+
+RATES_TTL = int(os.getenv('RATES_TTL', '600'))
+SPARKLINE_BARS = "▁▂▃▄▅▆▇█"
+
+
+class CachedRates:
+    __slots__ = ('fetched_at', 'source_updated_at', 'rates')
+
+    def __init__(self, fetched_at, source_updated_at, rates):
+        self.fetched_at = fetched_at
+        self.source_updated_at = source_updated_at
+        self.rates = rates
+
+
+_rate_cache = {}
+_rate_cache_lock = threading.Lock()
+
+
+def pack_rates(rates: dict) -> bytes:
+    return zlib.compress(json.dumps(rates, separators=(',', ':')).encode())
+
+
+def unpack_rates(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload))
+
+
+def load_rate_cache() -> None:
+    """Warm the in-memory cache with the latest stored snapshot of every base currency."""
+    snapshots = get_latest_rate_snapshots()
+    with _rate_cache_lock:
+        for base, fetched_at, source_updated_at, payload in snapshots:
+            _rate_cache[base] = CachedRates(fetched_at, source_updated_at, unpack_rates(payload))
+    logger.info(f"Загружены курсы валют для {len(snapshots)} базовых валют")
+
+
+def reload_rates(base: str) -> None:
+    """Pick up a snapshot of `base` stored by another process.
+
+    Alerts are checked against it too: this process will not fetch the same
+    rates itself while the cached copy is fresh.
+    """
+    snapshot = get_latest_rate_snapshot(base)
+    if snapshot is None:
+        return
+    fetched_at, source_updated_at, payload = snapshot
+    with _rate_cache_lock:
+        current = _rate_cache.get(base)
+        if current is not None and current.fetched_at >= fetched_at:
+            return
+        cached = CachedRates(fetched_at, source_updated_at, unpack_rates(payload))
+        _rate_cache[base] = cached
+    from alerts import notify_rates_updated
+    notify_rates_updated(base, cached.rates)
+
+
+# Свои снимки уже лежат в кэше: подписка только на изменения других процессов.
+subscribe("rates", reload_rates, local=False)
+
+
+def get_cached_rates(base: str, max_age=RATES_TTL):
+    cached = _rate_cache.get(base)
+    if cached is None:
+        return None
+    if max_age is not None and datetime.utcnow() - cached.fetched_at > timedelta(seconds=max_age):
+        return None
+    return cached
+
+
+def store_rates(base: str, data: dict) -> None:
+    """Cache a fresh upstream response and append it to the history.
+
+    exchangerate-api refreshes its rates a few times a day, so a fetch that
+    returns an already stored `time_last_updated` only refreshes the cache.
+    """
+    source_updated_at = data.get('time_last_updated')
+    cached = CachedRates(datetime.utcnow(), source_updated_at, data['rates'])
+    with _rate_cache_lock:
+        previous = _rate_cache.get(base)
+        _rate_cache[base] = cached
+    if previous is not None and source_updated_at and previous.source_updated_at == source_updated_at:
+        return
+    save_rate_snapshot(base, cached.fetched_at, source_updated_at, pack_rates(data['rates']))
+
+
+def cross_rate(base: str, rates: dict, from_currency: str, to_currency: str):
+    if from_currency == base:
+        return rates.get(to_currency)
+    if to_currency == base:
+        rate = rates.get(from_currency)
+        return 1 / rate if rate else None
+    if rates.get(from_currency) and to_currency in rates:
+        return rates[to_currency] / rates[from_currency]
+    return None
+
+
+def cached_cross_rate(from_currency: str, to_currency: str):
+    """Return (rate, fetched_at) from the in-memory cache only, or None.
+
+    The table for `from_currency` is preferred; otherwise any cached base that
+    quotes both currencies is used, however old it is.
+    """
+    cached = _rate_cache.get(from_currency)
+    if cached is not None:
+        rate = cross_rate(from_currency, cached.rates, from_currency, to_currency)
+        if rate is not None:
+            return rate, cached.fetched_at
+    for base, cached in list(_rate_cache.items()):
+        rate = cross_rate(base, cached.rates, from_currency, to_currency)
+        if rate is not None:
+            return rate, cached.fetched_at
+    return None
+
+
+def rate_on(from_currency: str, to_currency: str, day):
+    """Return (rate, fetched_at) from the last snapshot taken on `day` (UTC), or None."""
+    start = datetime(day.year, day.month, day.day)
+    rows = get_rate_snapshot_index(start, start + timedelta(days=1))
+    preferred = [row for row in rows if row.base == from_currency] or rows
+    for snapshot_id, base, fetched_at in reversed(preferred):
+        rates = unpack_rates(get_rate_snapshot_payloads([snapshot_id])[snapshot_id])
+        rate = cross_rate(base, rates, from_currency, to_currency)
+        if rate is not None:
+            return rate, fetched_at
+    return None
+
+
+def rate_history(from_currency: str, to_currency: str, days: int, points: int):
+    """Return up to `points` (fetched_at, rate) pairs evenly spread over the last `days` days.
+
+    Only ids and timestamps are read for the whole period; the period is split
+    into equal buckets and just the last snapshot of each bucket is decoded.
+    """
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    rows = get_rate_snapshot_index(start, end)
+    if not rows:
+        return []
+
+    span = (end - start).total_seconds()
+    buckets = {}
+    for row in rows:
+        bucket = min(points - 1, int((row.fetched_at - start).total_seconds() * points / span))
+        if row.base == from_currency or bucket not in buckets or buckets[bucket].base != from_currency:
+            buckets[bucket] = row
+
+    chosen = [buckets[bucket] for bucket in sorted(buckets)]
+    payloads = get_rate_snapshot_payloads([row.id for row in chosen])
+    history = []
+    for row in chosen:
+        rate = cross_rate(row.base, unpack_rates(payloads[row.id]), from_currency, to_currency)
+        if rate is not None:
+            history.append((row.fetched_at, rate))
+    return history
+
+
+def sparkline(values) -> str:
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARKLINE_BARS[len(SPARKLINE_BARS) // 2] * len(values)
+    scale = (len(SPARKLINE_BARS) - 1) / (high - low)
+    return "".join(SPARKLINE_BARS[round((value - low) * scale)] for value in values)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+import requests
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '5'))
+UPSTREAM_SLOW_CALL = float(os.getenv('UPSTREAM_SLOW_CALL', '3'))
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '30'))
+STALE_CACHE_SIZE = 1000
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class UpstreamResponse:
+    def __init__(self, status_code, data, fetched_at, stale=False):
+        self.status_code = status_code
+        self.data = data
+        self.fetched_at = fetched_at
+        self.stale = stale
+
+    def stale_note(self) -> str:
+        if not self.stale:
+            return ""
+        fetched = time.strftime('%d.%m.%Y %H:%M', time.localtime(self.fetched_at))
+        return f"\n\n⚠️ Сервис временно недоступен, показаны данные от {fetched}"
+
+
+class CircuitBreaker:
+    """Tracks recent calls to one host and stops calling it while it is failing.
+
+    A call counts as failed on a network error, a 5xx status or when it takes
+    longer than UPSTREAM_SLOW_CALL. Once enough of the recent calls failed the
+    circuit opens for BREAKER_COOLDOWN seconds, then lets a single probe
+    through to decide whether to close again.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = CLOSED
+        self._calls = deque(maxlen=BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= BREAKER_COOLDOWN:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        with self._lock:
+            ok = ok and latency <= UPSTREAM_SLOW_CALL
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    logger.info(f"Сервис {self.host} снова доступен")
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+
+            self._calls.append(ok)
+            failures = self._calls.count(False)
+            if len(self._calls) >= BREAKER_MIN_CALLS and failures / len(self._calls) >= BREAKER_ERROR_RATE:
+                self._open()
+
+    def _open(self) -> None:
+        logger.error(f"Сервис {self.host} недоступен, запросы приостановлены на {BREAKER_COOLDOWN:.0f} с")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_last_good = OrderedDict()
+_last_good_lock = threading.Lock()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers.setdefault(host, CircuitBreaker(host))
+    return breaker
+
+
+def _remember(cache_key: str, response: UpstreamResponse) -> None:
+    with _last_good_lock:
+        _last_good[cache_key] = response
+        _last_good.move_to_end(cache_key)
+        while len(_last_good) > STALE_CACHE_SIZE:
+            _last_good.popitem(last=False)
+
+
+def _stale(cache_key: str):
+    with _last_good_lock:
+        response = _last_good.get(cache_key)
+    if response is None:
+        return None
+    return UpstreamResponse(response.status_code, response.data, response.fetched_at, stale=True)
+
+
+def fetch_json(url: str, cache_key: str) -> UpstreamResponse:
+    """GET a JSON upstream through its host's circuit breaker.
+
+    `cache_key` identifies the request without secrets; the last successful
+    response for it is served, marked stale, whenever the upstream cannot be
+    reached. Raises UpstreamUnavailable if there is nothing to fall back on.
+    """
+    breaker = get_breaker(urlparse(url).hostname)
+    if not breaker.allow_request():
+        stale = _stale(cache_key)
+        if stale is None:
+            raise UpstreamUnavailable(breaker.host)
+        return stale
+
+    started = time.monotonic()
+    try:
+        response = requests.get(url, timeout=UPSTREAM_TIMEOUT)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        breaker.record(False, time.monotonic() - started)
+        logger.error(f"Ошибка запроса к {breaker.host}: {type(e).__name__}")
+        stale = _stale(cache_key)
+        if stale is None:
+            raise UpstreamUnavailable(breaker.host) from e
+        return stale
+
+    breaker.record(response.status_code < 500, time.monotonic() - started)
+    result = UpstreamResponse(response.status_code, data, time.time())
+    if response.status_code == 200:
+        _remember(cache_key, result)
+    elif response.status_code >= 500:
+        return _stale(cache_key) or result
+    return result
+
+
+async def fetch_json_async(url: str, cache_key: str) -> UpstreamResponse:
+    return await asyncio.to_thread(fetch_json, url, cache_key)
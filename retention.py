@@ -0,0 +1,98 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from background import start_background_task
+from database import get_expired_messages, delete_messages, incremental_vacuum
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_RETENTION_DAYS = int(os.getenv('MESSAGES_RETENTION_DAYS', '90'))
+MESSAGES_ARCHIVE_DIR = os.getenv('MESSAGES_ARCHIVE_DIR', 'archive')
+RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', '3600'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+RETENTION_BATCH_PAUSE = 0.2
+VACUUM_PAGES_PER_STEP = 200
+
+
+def archive_messages(rows) -> None:
+    """Append rows to gzip files, one file per month of creation.
+
+    Each call adds a new gzip member, which gzip readers treat as one stream,
+    so the files can be read with zcat or gzip.open as plain JSON lines.
+    """
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row.created_at.strftime('%Y-%m'), []).append(row)
+
+    os.makedirs(MESSAGES_ARCHIVE_DIR, exist_ok=True)
+    for month, month_rows in by_month.items():
+        path = os.path.join(MESSAGES_ARCHIVE_DIR, f"messages-{month}.jsonl.gz")
+        with open(path, 'ab') as file:
+            with gzip.GzipFile(fileobj=file, mode='wb') as archive:
+                for row in month_rows:
+                    archive.write((json.dumps({
+                        "id": row.id,
+                        "user_id": row.user_id,
+                        "content": row.content,
+                        "created_at": row.created_at.isoformat()
+                    }, ensure_ascii=False) + "\n").encode())
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def archive_batch(before) -> int:
+    """Archive and delete one batch of expired messages; return its size.
+
+    The rows are written to disk before they are deleted, so a crash between
+    the two steps can only archive a batch twice, never lose it. Each delete
+    is a short transaction of its own and does not hold the write lock for
+    longer than one batch.
+    """
+    rows = get_expired_messages(before, RETENTION_BATCH_SIZE)
+    if not rows:
+        return 0
+    if MESSAGES_ARCHIVE_DIR:
+        archive_messages(rows)
+    delete_messages([row.id for row in rows])
+    return len(rows)
+
+
+async def run_retention_cycle() -> None:
+    before = datetime.utcnow() - timedelta(days=MESSAGES_RETENTION_DAYS)
+    total = 0
+    while True:
+        archived = await asyncio.to_thread(archive_batch, before)
+        if not archived:
+            break
+        total += archived
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+    if not total:
+        return
+    logger.info(f"Перенесено в архив сообщений: {total}")
+
+    while True:
+        remaining = await asyncio.to_thread(incremental_vacuum, VACUUM_PAGES_PER_STEP)
+        if remaining is None:
+            logger.info("Инкрементальная очистка недоступна: для старой базы нужен однократный VACUUM")
+            return
+        if not remaining:
+            return
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+
+async def _retention_loop() -> None:
+    while True:
+        try:
+            await run_retention_cycle()
+        except Exception as e:
+            logger.error(f"Ошибка при архивировании сообщений: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+async def start_retention(application, shard: int = 0, shards: int = 1) -> None:
+    if shard != 0 or MESSAGES_RETENTION_DAYS <= 0:
+        return
+    start_background_task(_retention_loop(), "messages-retention")
@@ -0,0 +1,133 @@
+"""Fill the database with synthetic users, notes, goals, images and messages.
+
+    python seed.py --users 1000000 --messages-per-user 100
+
+Rows are appended after the existing ones, so the tool can be run
+repeatedly to grow a database. On SQLite the connection is switched to
+bulk-load pragmas for the duration of the run.
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from database import engine, init_db, Session, User, Note, Goal, Image, Message
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20000
+WORDS = (
+    "купить молоко хлеб позвонить маме встреча проект отчёт спорт книга фильм "
+    "#работа #дом #идеи #покупки #учёба завтра вечером срочно важно"
+).split()
+LOAD_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+)
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _next_id(model):
+    session = Session()
+    try:
+        return (session.query(func.max(model.id)).scalar() or 0) + 1
+    finally:
+        session.close()
+
+
+def _insert(connection, table, rows) -> int:
+    """Insert rows from an iterator in executemany batches of BATCH_SIZE."""
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def seed(users, notes_per_user, goals_per_user, images_per_user, messages_per_user, seed_value=0) -> None:
+    rng = random.Random(seed_value)
+    init_db()
+    first_user = _next_id(User)
+    first_note = _next_id(Note)
+    user_ids = range(first_user, first_user + users)
+    now = datetime.utcnow()
+
+    def past(days):
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    def user_rows():
+        for user_id in user_ids:
+            yield {"id": user_id, "telegram_id": 10 ** 9 + user_id, "username": f"user{user_id}",
+                   "first_name": "Test", "created_at": past(365)}
+
+    def note_rows():
+        note_id = first_note
+        for user_id in user_ids:
+            for _ in range(notes_per_user):
+                yield {"id": note_id, "user_id": user_id, "content": _text(rng, 8), "created_at": past(365)}
+                note_id += 1
+
+    def goal_rows():
+        for user_id in user_ids:
+            for _ in range(goals_per_user):
+                yield {"user_id": user_id, "title": _text(rng, 3), "description": _text(rng, 10),
+                       "status": "В процессе", "created_at": past(365)}
+
+    def image_rows():
+        for index, user_id in enumerate(user_ids):
+            for number in range(min(images_per_user, notes_per_user)):
+                yield {"user_id": user_id, "file_id": f"seed-{user_id}-{number}", "description": "Без описания",
+                       "note_id": first_note + index * notes_per_user + number, "created_at": past(365)}
+
+    def message_rows():
+        for user_id in user_ids:
+            for _ in range(messages_per_user):
+                yield {"user_id": user_id, "content": _text(rng, 6), "created_at": past(180)}
+
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            for pragma in LOAD_PRAGMAS:
+                connection.exec_driver_sql(pragma)
+        for table, rows in (
+            (User.__table__, user_rows()),
+            (Note.__table__, note_rows()),
+            (Goal.__table__, goal_rows()),
+            (Image.__table__, image_rows()),
+            (Message.__table__, message_rows()),
+        ):
+            started = time.monotonic()
+            inserted = _insert(connection, table, rows)
+            connection.commit()
+            elapsed = time.monotonic() - started
+            logger.info(f"{table.name}: {inserted} строк за {elapsed:.1f} с ({inserted / max(elapsed, 1e-9):.0f} строк/с)")
+        if engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql("ANALYZE")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заполнить базу синтетическими данными")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--notes-per-user', type=int, default=5)
+    parser.add_argument('--goals-per-user', type=int, default=2)
+    parser.add_argument('--images-per-user', type=int, default=1)
+    parser.add_argument('--messages-per-user', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    seed(args.users, args.notes_per_user, args.goals_per_user, args.images_per_user, args.messages_per_user, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from telegram.ext import Application, PicklePersistence
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 10
+HEARTBEAT_INTERVAL = 2
+HEARTBEAT_TIMEOUT = int(os.getenv('SHARD_HEARTBEAT_TIMEOUT', '30'))
+WORKER_STOP_TIMEOUT = 30
+# Зависший шард сигнал остановки скорее всего не прочитает: ждём его недолго.
+HUNG_WORKER_STOP_TIMEOUT = 5
+# Сколько ждать следующего сообщения при переносе старой очереди шарда.
+QUEUE_DRAIN_TIMEOUT = 0.1
+STATE_FILE = os.getenv('SHARD_STATE_FILE', 'notibot_state_{shard}.pickle')
+
+
+def shard_for(update: Update, shards: int) -> int:
+    """Pick a worker for the update so that one user always lands on the same process."""
+    if update.effective_user:
+        key = update.effective_user.id
+    elif update.effective_chat:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % shards
+
+
+def _worker_main(shard: int, shards: int, token: str, updates, heartbeats) -> None:
+    from logs import setup_logging
+    setup_logging(shard)
+    # Остановкой шардов управляет супервизор через очередь, поэтому сигналы,
+    # разосланные всей группе процессов (Ctrl+C, systemd), здесь игнорируются.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(shard, shards, token, updates, heartbeats))
+
+
+async def _run_worker(shard: int, shards: int, token: str, updates, heartbeats) -> None:
+    from background import stop_background_tasks
+    from bot import build_application, prepare_storage, start_services
+    from dedupe import DEDUPE_STATE_FILE, load_processed_updates, save_processed_updates
+
+    dedupe_file = DEDUPE_STATE_FILE.format(shard=shard) if DEDUPE_STATE_FILE else None
+    load_processed_updates(dedupe_file)
+    persistence = PicklePersistence(filepath=STATE_FILE.format(shard=shard))
+    builder = Application.builder().updater(None).persistence(persistence)
+    application = build_application(token, builder)
+    loop = asyncio.get_running_loop()
+
+    await asyncio.to_thread(prepare_storage)
+    async with application:
+        await application.start()
+        await start_services(application, shard, shards)
+        logger.info(f"Шард {shard} готов к обработке обновлений")
+        while True:
+            heartbeats[shard] = time.time()
+            try:
+                data = await loop.run_in_executor(None, updates.get, True, HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        logger.info(f"Шард {shard} завершает работу")
+        await stop_background_tasks()
+        await application.stop()
+        save_processed_updates(dedupe_file)
+
+
+class ShardSupervisor:
+    """Receives updates once and routes them to N worker processes by user id."""
+
+    def __init__(self, token: str, shards: int):
+        self.token = token
+        self.shards = shards
+        self._ctx = multiprocessing.get_context('spawn')
+        self._queues = [self._ctx.Queue() for _ in range(shards)]
+        # Очередь шарда подменяется из потока перезапуска, пока цикл опроса в неё пишет.
+        self._queues_lock = threading.Lock()
+        self._heartbeats = self._ctx.Array('d', shards, lock=False)
+        self._workers = [None] * shards
+        self._running = False
+        self._restart = None
+
+    def _start_worker(self, shard: int) -> None:
+        self._heartbeats[shard] = time.time()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(shard, self.shards, self.token, self._queues[shard], self._heartbeats),
+            name=f"notibot-shard-{shard}"
+        )
+        process.start()
+        self._workers[shard] = process
+        logger.info(f"Запущен шард {shard} (pid {process.pid})")
+
+    def _replace_queue(self, shard: int) -> None:
+        """Give the shard a fresh queue after its process was killed or died.
+
+        A process killed inside Queue.get() can leave the queue's read lock
+        held or a message half read, and the next worker would hang on it.
+        Pending updates are moved over while the old queue can still be read;
+        the lock keeps the poll loop from writing into the old queue meanwhile.
+        """
+        with self._queues_lock:
+            old = self._queues[shard]
+            new = self._ctx.Queue()
+            moved = 0
+            try:
+                while True:
+                    data = old.get(timeout=QUEUE_DRAIN_TIMEOUT)
+                    if data is not None:
+                        new.put(data)
+                        moved += 1
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"Очередь шарда {shard} повреждена: {e}")
+            try:
+                left = old.qsize()
+            except NotImplementedError:
+                left = 0
+            if left:
+                # Убитый процесс мог оставить блокировку чтения занятой: остаток не прочитать.
+                logger.warning(f"Из очереди шарда {shard} не удалось перенести обновлений: {left}")
+            old.close()
+            old.cancel_join_thread()
+            self._queues[shard] = new
+        logger.info(f"Очередь шарда {shard} пересоздана, перенесено обновлений: {moved}")
+
+    def _put(self, shard: int, data) -> None:
+        with self._queues_lock:
+            self._queues[shard].put(data)
+
+    def _stop_worker(self, shard: int, timeout: float = WORKER_STOP_TIMEOUT) -> None:
+        process = self._workers[shard]
+        if process is None:
+            return
+        # Сигнал остановки встаёт в очередь после уже принятых обновлений,
+        # поэтому шард сначала дорабатывает их, а остальное заберёт новый процесс.
+        self._put(shard, None)
+        process.join(timeout)
+        if process.is_alive():
+            # SIGTERM шард игнорирует, поэтому остаётся только SIGKILL.
+            logger.error(f"Шард {shard} не остановился за {timeout} с, завершаем принудительно")
+            process.kill()
+            process.join()
+            self._replace_queue(shard)
+        self._workers[shard] = None
+
+    def check_health(self) -> None:
+        if self._restart is not None and not self._restart.done():
+            return
+        now = time.time()
+        for shard, process in enumerate(self._workers):
+            if not process.is_alive():
+                logger.error(f"Шард {shard} завершился с кодом {process.exitcode}, перезапуск")
+                self._replace_queue(shard)
+                self._start_worker(shard)
+            elif now - self._heartbeats[shard] > HEARTBEAT_TIMEOUT:
+                logger.error(f"Шард {shard} не отвечает {now - self._heartbeats[shard]:.0f} с, перезапуск")
+                self._stop_worker(shard, HUNG_WORKER_STOP_TIMEOUT)
+                self._start_worker(shard)
+
+    def rolling_restart(self) -> None:
+        logger.info("Поочерёдный перезапуск шардов...")
+        for shard in range(self.shards):
+            self._stop_worker(shard)
+            self._start_worker(shard)
+        logger.info("Поочерёдный перезапуск завершён")
+
+    def request_rolling_restart(self) -> None:
+        if self._restart is not None and not self._restart.done():
+            logger.info("Перезапуск шардов уже выполняется")
+            return
+        loop = asyncio.get_running_loop()
+        self._restart = loop.run_in_executor(None, self.rolling_restart)
+
+    def stop(self) -> None:
+        self._running = False
+
+    async def _poll(self) -> None:
+        from bot import COMMANDS, TELEGRAM_API_URL
+        from transport import build_request
+
+        offset = None
+        bot = Bot(
+            self.token,
+            base_url=TELEGRAM_API_URL,
+            request=build_request(pool_size=1),
+            get_updates_request=build_request(get_updates=True)
+        )
+        async with bot:
+            await bot.set_my_commands(COMMANDS)
+            while self._running:
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset,
+                        timeout=POLL_TIMEOUT,
+                        read_timeout=POLL_TIMEOUT + 5,
+                        allowed_updates=Update.ALL_TYPES
+                    )
+                except NetworkError as e:
+                    logger.error(f"Ошибка при получении обновлений: {e}")
+                    await asyncio.sleep(1)
+                    updates = []
+
+                for update in updates:
+                    self._put(shard_for(update, self.shards), update.to_dict())
+                    offset = update.update_id + 1
+
+                self.check_health()
+
+            # Подтверждаем последние полученные обновления, чтобы они не пришли повторно.
+            if offset is not None:
+                try:
+                    await bot.get_updates(offset=offset, timeout=0)
+                except NetworkError as e:
+                    logger.error(f"Не удалось подтвердить последние обновления: {e}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self.request_rolling_restart)
+        loop.add_signal_handler(signal.SIGTERM, self.stop)
+        loop.add_signal_handler(signal.SIGINT, self.stop)
+
+        self._running = True
+        for shard in range(self.shards):
+            self._start_worker(shard)
+        try:
+            await self._poll()
+        finally:
+            if self._restart is not None:
+                await self._restart
+            logger.info("Остановка шардов...")
+            for shard in range(self.shards):
+                self._stop_worker(shard)
+
+    def run(self) -> None:
+        logger.info(f"Супервизор запущен: {self.shards} шардов, SIGHUP - поочерёдный перезапуск")
+        asyncio.run(self._run())
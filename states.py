@@ -0,0 +1,12 @@
+WAITING_FOR_NOTE = 1
+WAITING_FOR_GOAL_TITLE = 2
+WAITING_FOR_GOAL_DESCRIPTION = 3
+
+GUESSING_NUMBER = 4
+PLAYING_RPS = 5
+PLAYING_QUIZ = 6
+
+EDITING_NOTE = 7
+WAITING_FOR_FOLDER_NAME = 8
+
+user_states = {}
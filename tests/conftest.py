@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Модули читают настройки при импорте, поэтому база для тестов задаётся до них.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import alerts
+
+
+def make_alert(alert_id, direction, threshold):
+    return SimpleNamespace(id=alert_id, chat_id=alert_id, from_currency="USD", to_currency="RUB",
+                           direction=direction, threshold=threshold)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = alerts.AlertIndex()
+    for alert in (make_alert(1, ">", 90), make_alert(2, ">", 100), make_alert(3, "<", 80)):
+        index.add(alert)
+    monkeypatch.setattr(alerts, "alert_index", index)
+    monkeypatch.setattr(alerts, "_notifications", asyncio.Queue())
+    return index
+
+
+def test_pop_crossed_returns_only_crossed(index):
+    assert [alert.id for alert in index.pop_crossed(("USD", "RUB"), 95)] == [1]
+    assert [alert.id for alert in index.pop_crossed(("USD", "RUB"), 70)] == [3]
+    assert len(index) == 1
+
+
+def test_crossed_alerts_are_deactivated_and_sent(index, monkeypatch):
+    deactivated = []
+    monkeypatch.setattr(alerts, "deactivate_currency_alerts", deactivated.extend)
+    asyncio.run(alerts.on_rates_updated("USD", {"USD": 1, "RUB": 95}))
+    assert deactivated == [1]
+    assert alerts._notifications.qsize() == 1
+    assert len(index) == 2
+
+
+def test_alerts_return_to_index_when_deactivation_fails(index, monkeypatch):
+    def fail(alert_ids):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(alerts, "deactivate_currency_alerts", fail)
+    with pytest.raises(RuntimeError):
+        asyncio.run(alerts.on_rates_updated("USD", {"USD": 1, "RUB": 95}))
+    assert len(index) == 3
+    assert alerts._notifications.qsize() == 0
+    assert [alert.id for alert in index.pop_crossed(("USD", "RUB"), 95)] == [1]
@@ -0,0 +1,34 @@
+from analytics import HyperLogLog
+
+
+def test_hyperloglog_counts_distinct_ids():
+    sketch = HyperLogLog()
+    for user_id in range(50000):
+        sketch.add(user_id)
+        sketch.add(user_id)
+    assert abs(sketch.count() - 50000) < 50000 * 0.05
+
+
+def test_hyperloglog_small_counts_are_exact_enough():
+    sketch = HyperLogLog()
+    for user_id in range(100):
+        sketch.add(user_id)
+    assert abs(sketch.count() - 100) <= 2
+    assert HyperLogLog().count() == 0
+
+
+def test_hyperloglog_merge_is_union():
+    first, second = HyperLogLog(), HyperLogLog()
+    for user_id in range(20000):
+        first.add(user_id)
+    for user_id in range(10000, 30000):
+        second.add(user_id)
+    first.merge(second)
+    assert abs(first.count() - 30000) < 30000 * 0.05
+
+
+def test_hyperloglog_pack_round_trip():
+    sketch = HyperLogLog()
+    for user_id in range(1000):
+        sketch.add(-user_id)
+    assert HyperLogLog.unpack(sketch.pack()).registers == sketch.registers
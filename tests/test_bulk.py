@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from database import create_note, create_user, get_selectable_items, init_db
+from handlers import button_callback
+
+
+class FakeQuery:
+    def __init__(self, telegram_id, data):
+        self.data = data
+        self.from_user = SimpleNamespace(id=telegram_id)
+        self.answers = []
+        self.edits = []
+        self.message = SimpleNamespace(edit_text=self.edit_text, reply_text=self.edit_text)
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+@pytest.fixture(scope="module")
+def user():
+    init_db()
+    user = create_user(telegram_id=555001, username="bulk", first_name="Bulk", last_name=None)
+    create_note(user.id, "заметка для выбора")
+    return user
+
+
+def press(user, data, user_data):
+    query = FakeQuery(user.telegram_id, data)
+    update = SimpleNamespace(callback_query=query, effective_user=query.from_user)
+    asyncio.run(button_callback(update, SimpleNamespace(user_data=user_data)))
+    return query
+
+
+@pytest.mark.parametrize("action", ["delete", "archive"])
+def test_empty_selection_is_answered_once(user, action):
+    user_data = {}
+    press(user, "bulk_notes_open", user_data)
+    query = press(user, f"bulk_notes_{action}", user_data)
+    assert query.answers == ["Ничего не выбрано"]
+    assert query.edits == []
+    assert get_selectable_items("notes", user.id)
+
+
+def test_selection_menu_answers_once(user):
+    query = press(user, "bulk_notes_open", {})
+    assert query.answers == [None]
+    assert query.edits and query.edits[0].startswith("☑️ Выбери")
@@ -0,0 +1,18 @@
+from dedupe import DedupeWindow
+
+
+def test_duplicates_are_rejected():
+    window = DedupeWindow(3)
+    assert window.add(1)
+    assert not window.add(1)
+    assert 1 in window
+
+
+def test_oldest_id_is_forgotten():
+    window = DedupeWindow(3)
+    for update_id in (1, 2, 3, 4):
+        assert window.add(update_id)
+    assert 1 not in window
+    assert window.snapshot() == [2, 3, 4]
+    assert window.add(1)
+    assert window.snapshot() == [3, 4, 1]
@@ -0,0 +1,27 @@
+import pytest
+from inline import parse_query
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("100 usd eur", (100.0, "USD", ("EUR",))),
+    ("100usd в eur", (100.0, "USD", ("EUR",))),
+    ("2,5 $ in €", (2.5, "USD", ("EUR",))),
+    ("100 usd to top", (100.0, "USD", ("TOP",))),
+    ("100 usd inr", (100.0, "USD", ("INR",))),
+    ("100 usd top", (100.0, "USD", ("TOP",))),
+    ("100 usd try", (100.0, "USD", ("TRY",))),
+    ("100 usd вон", (100.0, "USD", ("ВОН",))),
+])
+def test_parse_query_target(query, expected):
+    assert parse_query(query) == expected
+
+
+def test_parse_query_default_targets():
+    amount, base, targets = parse_query("100 $")
+    assert (amount, base) == (100.0, "USD")
+    assert "USD" not in targets and "EUR" in targets
+
+
+@pytest.mark.parametrize("query", ["", "usd eur", "100 dollars", "100 usd euros", "100 usd in"])
+def test_parse_query_rejects(query):
+    assert parse_query(query) is None
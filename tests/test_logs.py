@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from telegram import Update
+from logs import BoundUpdateProcessor, SamplingFilter, current_update
+
+
+def make_record(level):
+    return logging.LogRecord("bot", level, __file__, 1, "msg", None, None)
+
+
+def test_rate_limit_spares_errors():
+    sampling = SamplingFilter({}, rate_limit=1)
+    assert sampling.filter(make_record(logging.INFO))
+    assert not sampling.filter(make_record(logging.INFO))
+    assert sampling.filter(make_record(logging.ERROR))
+    assert sampling.filter(make_record(logging.CRITICAL))
+
+
+def test_update_binding_is_reset():
+    seen = []
+
+    async def handle():
+        seen.append(current_update.get())
+
+    async def main():
+        processor = BoundUpdateProcessor(1)
+        await processor.process_update(Update(update_id=7), handle())
+        seen.append(current_update.get())
+
+    asyncio.run(main())
+    assert seen == [(7, None, None), None]
@@ -0,0 +1,47 @@
+import pytest
+from database import Image, Session, create_note, delete_notes, get_note_image, init_db, set_notes_archived
+from notes import NOTE_SNAPSHOT_INTERVAL, apply_delta, build_revision, edit_note, make_delta, rebuild_version
+
+
+@pytest.mark.parametrize("old, new", [
+    ("купить молоко и хлеб", "купить молоко, хлеб и сыр"),
+    ("", "новая заметка"),
+    ("строка\nвторая  строка", "строка\n\nвторая строка"),
+    ("одинаковый текст", "одинаковый текст"),
+])
+def test_delta_round_trip(old, new):
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_build_revision_snapshots():
+    assert build_revision(1, "", "текст")[1] is True
+    assert build_revision(NOTE_SNAPSHOT_INTERVAL + 1, "текст", "текст!")[1] is True
+    long_text = "слово " * 50
+    assert build_revision(2, long_text, long_text + "ещё")[1] is False
+
+
+def test_rebuild_every_version():
+    init_db()
+    versions = ["версия 0 #тест"]
+    note_id = create_note(1, versions[0], ["тест"])
+    for number in range(1, NOTE_SNAPSHOT_INTERVAL + 5):
+        versions.append(f"версия {number} " + "общий текст заметки " * 5)
+        assert edit_note(note_id, 1, versions[-1]) == number + 1
+    for version, content in enumerate(versions, start=1):
+        assert rebuild_version(note_id, version) == content
+    assert rebuild_version(note_id, len(versions) + 1) is None
+
+
+def test_note_image_only_for_active_notes():
+    init_db()
+    note_ids = [create_note(2, f"заметка {number}") for number in range(2)]
+    session = Session()
+    session.add_all(Image(user_id=2, file_id=f"photo {note_id}", note_id=note_id) for note_id in note_ids)
+    session.commit()
+    session.close()
+    assert tuple(get_note_image(note_ids[0], 2)) == (f"photo {note_ids[0]}", "заметка 0")
+    assert get_note_image(note_ids[0], 3) is None
+    delete_notes(2, [note_ids[0]])
+    set_notes_archived(2, True, [note_ids[1]])
+    assert get_note_image(note_ids[0], 2) is None
+    assert get_note_image(note_ids[1], 2) is None
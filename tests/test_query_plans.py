@@ -0,0 +1,31 @@
+import pytest
+from database import Session, User, create_note
+from query_plans import CASES, collect_plans, full_scans
+from seed import seed
+
+
+@pytest.fixture(scope="module")
+def user():
+    seed(users=50, notes_per_user=5, goals_per_user=2, images_per_user=1, messages_per_user=5)
+    session = Session()
+    try:
+        user = session.query(User).order_by(User.id).offset(25).first()
+        session.expunge(user)
+    finally:
+        session.close()
+    create_note(user.id, "купить молоко #дом", ["дом"])
+    return user
+
+
+def test_handler_queries_use_indexes(user):
+    results = collect_plans(user)
+    assert set(results) == set(CASES)
+    for name, (_, plans) in results.items():
+        assert plans, name
+        for plan in plans:
+            assert not full_scans(plan), (name, plan)
+
+
+def test_full_scans_detects_table_scan():
+    assert full_scans(["SCAN notes", "SEARCH users USING INDEX ix (id=?)"]) == ["SCAN notes"]
+    assert full_scans(["SCAN notes USING COVERING INDEX ix_notes_user_id"]) == []
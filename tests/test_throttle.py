@@ -0,0 +1,47 @@
+from throttle import ALLOW, REJECT, REJECT_FIRST, Throttle, parse_limits
+
+
+def make_throttle(max_users=100):
+    return Throttle(parse_limits("default=1/2,upstream=0.5/1"), max_users)
+
+
+def test_parse_limits():
+    assert parse_limits("default=2/10,upstream=0.2") == {"default": (2.0, 10.0), "upstream": (0.2, 0.2)}
+
+
+def test_burst_then_reject_once():
+    throttle = make_throttle()
+    assert throttle.check(1, "default", 0.0) == ALLOW
+    assert throttle.check(1, "default", 0.0) == ALLOW
+    assert throttle.check(1, "default", 0.0) == REJECT_FIRST
+    assert throttle.check(1, "default", 0.1) == REJECT
+
+
+def test_bucket_refills_and_resets_warning():
+    throttle = make_throttle()
+    for _ in range(3):
+        throttle.check(1, "default", 0.0)
+    assert throttle.check(1, "default", 1.0) == ALLOW
+    assert throttle.check(1, "default", 1.0) == REJECT_FIRST
+
+
+def test_classes_and_users_are_independent():
+    throttle = make_throttle()
+    assert throttle.check(1, "upstream", 0.0) == ALLOW
+    assert throttle.check(1, "upstream", 0.0) == REJECT_FIRST
+    assert throttle.check(1, "default", 0.0) == ALLOW
+    assert throttle.check(2, "upstream", 0.0) == ALLOW
+    # Неизвестный класс считается классом по умолчанию.
+    assert throttle.check(3, "unknown", 0.0) == ALLOW
+
+
+def test_least_recently_seen_user_is_evicted():
+    throttle = make_throttle(max_users=2)
+    throttle.check(1, "default", 0.0)
+    throttle.check(2, "default", 0.0)
+    throttle.check(1, "default", 0.0)
+    throttle.check(3, "default", 0.0)
+    assert len(throttle) == 2
+    # Пользователь 2 вытеснен и получает полный запас заново.
+    assert throttle.check(2, "default", 0.0) == ALLOW
+    assert throttle.check(2, "default", 0.0) == ALLOW
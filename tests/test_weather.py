@@ -0,0 +1,17 @@
+import pytest
+from weather import geohash_center, geohash_encode
+
+
+@pytest.mark.parametrize("latitude, longitude, expected", [
+    (57.64911, 10.40744, "u4pruydqqvj"),
+    (42.605, -5.603, "ezs42"),
+])
+def test_geohash_encode(latitude, longitude, expected):
+    assert geohash_encode(latitude, longitude, len(expected)) == expected
+
+
+def test_geohash_center_is_inside_cell():
+    geohash = geohash_encode(55.7558, 37.6173, 5)
+    latitude, longitude = geohash_center(geohash)
+    assert geohash_encode(latitude, longitude, 5) == geohash
+    assert abs(latitude - 55.7558) < 0.03 and abs(longitude - 37.6173) < 0.03
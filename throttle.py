@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+from array import array
+from collections import OrderedDict
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from admin import is_admin
+
+logger = logging.getLogger(__name__)
+
+# "класс=запросов_в_секунду/запас": upstream — команды, которые ходят во внешние API.
+THROTTLE_LIMITS = os.getenv('THROTTLE_LIMITS', 'default=2/10,upstream=0.2/3')
+THROTTLE_MAX_USERS = int(os.getenv('THROTTLE_MAX_USERS', '100000'))
+UPSTREAM_COMMANDS = {"weather", "convert", "currency", "rates_history", "digest"}
+UPSTREAM_CALLBACKS = {"weather", "currency"}
+
+ALLOW = 0
+REJECT = 1
+REJECT_FIRST = 2
+
+
+def parse_limits(value: str) -> dict:
+    limits = {}
+    for item in value.split(','):
+        name, _, limit = item.partition('=')
+        rate, _, burst = limit.partition('/')
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class Throttle:
+    """Token buckets for every user and command class in one LRU-ordered dict.
+
+    A user's state is a single array('d'): the tokens and last refill time of
+    each class plus a flag telling whether the user was already told they
+    are throttled. Users beyond `max_users` are evicted least recently seen
+    first; by then their buckets have usually refilled, so eviction costs
+    nothing but a fresh full bucket.
+    """
+
+    def __init__(self, limits: dict, max_users: int):
+        self.classes = {name: index for index, name in enumerate(limits)}
+        self.limits = list(limits.values())
+        self.max_users = max_users
+        self._users = OrderedDict()
+
+    def __len__(self):
+        return len(self._users)
+
+    def check(self, user_id: int, command_class: str, now: float) -> int:
+        index = self.classes.get(command_class, 0)
+        count = len(self.limits)
+        state = self._users.get(user_id)
+        if state is None:
+            state = array('d', [burst for _, burst in self.limits] + [now] * count + [0])
+            self._users[user_id] = state
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+
+        rate, burst = self.limits[index]
+        tokens = min(burst, state[index] + (now - state[count + index]) * rate)
+        state[count + index] = now
+        if tokens >= 1:
+            state[index] = tokens - 1
+            state[-1] = 0
+            return ALLOW
+        state[index] = tokens
+        if state[-1]:
+            return REJECT
+        state[-1] = 1
+        return REJECT_FIRST
+
+
+throttle = Throttle(parse_limits(THROTTLE_LIMITS), THROTTLE_MAX_USERS)
+
+
+def command_class(update: Update) -> str:
+    message = update.message
+    if message is not None:
+        if message.location:
+            return "upstream"
+        text = message.text or ""
+        if text.startswith('/') and len(text) > 1:
+            command = text[1:].split(maxsplit=1)[0].split('@')[0].lower()
+            if command in UPSTREAM_COMMANDS:
+                return "upstream"
+    elif update.callback_query and update.callback_query.data in UPSTREAM_CALLBACKS:
+        return "upstream"
+    return "default"
+
+
+async def throttle_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop updates from users over their limit before any handler runs.
+
+    Only the first dropped update of a burst gets a reply; the rest are
+    discarded silently until the user is allowed through again. Inline
+    queries are debounced by their own handler and are not throttled here.
+    """
+    if update.effective_user is None or update.inline_query is not None or is_admin(update):
+        return
+
+    decision = throttle.check(update.effective_user.id, command_class(update), time.monotonic())
+    if decision == ALLOW:
+        return
+    if decision == REJECT_FIRST:
+        logger.info("Пользователь %s превысил лимит запросов", update.effective_user.id)
+        text = "⏳ Слишком много запросов. Подожди немного и попробуй снова."
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(text)
+            elif update.effective_message:
+                await update.effective_message.reply_text(text)
+        except TelegramError as e:
+            logger.error(f"Не удалось предупредить пользователя о лимите: {e}")
+    raise ApplicationHandlerStop
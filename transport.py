@@ -0,0 +1,94 @@
+import logging
+import os
+from telegram.request import BaseRequest, HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Готовые наборы настроек транспорта; любое значение можно переопределить
+# отдельной переменной окружения ниже.
+PROFILES = {
+    "default": {
+        "pool_size": 256, "get_updates_pool_size": 1, "http_version": "1.1",
+        "timeouts": "connect=5,read=5,write=5,pool=1",
+    },
+    "throughput": {
+        "pool_size": 512, "get_updates_pool_size": 1, "http_version": "2",
+        "timeouts": "connect=5,read=10,write=10,pool=5",
+    },
+    "small": {
+        "pool_size": 8, "get_updates_pool_size": 1, "http_version": "1.1",
+        "timeouts": "connect=5,read=5,write=5,pool=3",
+    },
+}
+TRANSPORT_PROFILE = os.getenv('TRANSPORT_PROFILE', 'default')
+_profile = PROFILES.get(TRANSPORT_PROFILE, PROFILES["default"])
+BOT_POOL_SIZE = int(os.getenv('BOT_POOL_SIZE', _profile["pool_size"]))
+BOT_GET_UPDATES_POOL_SIZE = int(os.getenv('BOT_GET_UPDATES_POOL_SIZE', _profile["get_updates_pool_size"]))
+BOT_HTTP_VERSION = os.getenv('BOT_HTTP_VERSION', _profile["http_version"])
+BOT_TIMEOUTS = os.getenv('BOT_TIMEOUTS', _profile["timeouts"])
+# Таймаут чтения для отдельных методов API: "sendDocument=60,sendPhoto=30".
+BOT_METHOD_TIMEOUTS = os.getenv('BOT_METHOD_TIMEOUTS', 'sendDocument=60,sendPhoto=30,getFile=30')
+
+
+def parse_pairs(value: str) -> dict:
+    pairs = {}
+    for item in value.split(','):
+        name, _, number = item.partition('=')
+        if name.strip() and number.strip():
+            pairs[name.strip()] = float(number)
+    return pairs
+
+
+class TunedRequest(HTTPXRequest):
+    """HTTPXRequest with per-method read timeouts.
+
+    The timeout of a method listed in `method_timeouts` replaces the default
+    read timeout unless the caller passed its own, so slow uploads do not
+    need a large timeout for every request. Only the public constructor and
+    do_request() are used, so PTB upgrades do not break it.
+    """
+
+    def __init__(self, method_timeouts: dict, **kwargs):
+        self.method_timeouts = method_timeouts
+        super().__init__(**kwargs)
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         **kwargs):
+        if read_timeout is BaseRequest.DEFAULT_NONE:
+            read_timeout = self.method_timeouts.get(url.rsplit('/', 1)[-1], read_timeout)
+        return await super().do_request(url, method, request_data, read_timeout=read_timeout, **kwargs)
+
+
+def build_request(pool_size: int = None, get_updates: bool = False) -> HTTPXRequest:
+    """Build a request object from the transport settings.
+
+    The long-poll getUpdates call gets its own small pool, so it never holds
+    a connection that outgoing messages are waiting for.
+    """
+    if pool_size is None:
+        pool_size = BOT_GET_UPDATES_POOL_SIZE if get_updates else BOT_POOL_SIZE
+    timeouts = parse_pairs(BOT_TIMEOUTS)
+    kwargs = dict(
+        method_timeouts={} if get_updates else parse_pairs(BOT_METHOD_TIMEOUTS),
+        connection_pool_size=pool_size,
+        connect_timeout=timeouts.get("connect", 5.0),
+        read_timeout=timeouts.get("read", 5.0),
+        write_timeout=timeouts.get("write", 5.0),
+        pool_timeout=timeouts.get("pool", 1.0),
+        http_version=BOT_HTTP_VERSION,
+    )
+    try:
+        return TunedRequest(**kwargs)
+    except RuntimeError as e:
+        # HTTP/2 требует пакет h2 (python-telegram-bot[http2]).
+        logger.warning(f"Не удалось включить HTTP/{BOT_HTTP_VERSION}, используется HTTP/1.1: {e}")
+        kwargs["http_version"] = "1.1"
+        return TunedRequest(**kwargs)
+
+
+def apply_transport(builder):
+    logger.info(
+        f"Транспорт: профиль {TRANSPORT_PROFILE}, HTTP/{BOT_HTTP_VERSION}, пул {BOT_POOL_SIZE}, "
+        f"пул getUpdates {BOT_GET_UPDATES_POOL_SIZE}"
+    )
+    return builder.request(build_request()).get_updates_request(build_request(get_updates=True))
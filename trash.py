@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from background import start_background_task
+from database import restore_deleted, purge_deleted
+
+logger = logging.getLogger(__name__)
+
+UNDO_WINDOW = int(os.getenv('UNDO_WINDOW', '300'))
+PURGE_INTERVAL = int(os.getenv('PURGE_INTERVAL', '60'))
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '200'))
+PURGE_BATCH_PAUSE = 0.2
+# Очередь обновлений длиннее этого значения считается нагрузкой: очистка ждёт.
+PURGE_BUSY_QUEUE = 5
+EPOCH = datetime(1970, 1, 1)
+TITLES = {"notes": "Заметки", "goals": "Цели"}
+
+
+def undo_markup(kind: str, deleted_at: datetime, back: str = None) -> InlineKeyboardMarkup:
+    """Keyboard with an undo button for one delete call, optionally with a back button."""
+    stamp = (deleted_at - EPOCH) // timedelta(microseconds=1)
+    keyboard = [[InlineKeyboardButton("↩️ Отменить удаление", callback_data=f"undo_{kind}_{stamp}")]]
+    if back:
+        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=back)])
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def handle_undo(update: Update, context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    query = update.callback_query
+    _, kind, stamp = query.data.split("_")
+    deleted_at = EPOCH + timedelta(microseconds=int(stamp))
+    back = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=kind)]])
+
+    if datetime.utcnow() - deleted_at > timedelta(seconds=UNDO_WINDOW):
+        await query.message.edit_text("⌛ Время для отмены удаления истекло.", reply_markup=back)
+        return
+    restored = restore_deleted(kind, user.id, deleted_at)
+    if restored:
+        await query.message.edit_text(f"↩️ {TITLES[kind]} восстановлены: {restored}", reply_markup=back)
+    else:
+        await query.message.edit_text("❌ Нечего восстанавливать.", reply_markup=back)
+
+
+async def run_purge_cycle(application) -> None:
+    """Purge rows whose undo window has passed, one short transaction per batch.
+
+    Batches are only taken while the update queue is short, so the purge
+    does not compete with users for the database write lock.
+    """
+    before = datetime.utcnow() - timedelta(seconds=UNDO_WINDOW)
+    total = 0
+    for kind in ("notes", "goals"):
+        while True:
+            if application.update_queue.qsize() > PURGE_BUSY_QUEUE:
+                await asyncio.sleep(PURGE_BATCH_PAUSE)
+                continue
+            purged = await asyncio.to_thread(purge_deleted, kind, before, PURGE_BATCH_SIZE)
+            if not purged:
+                break
+            total += purged
+            await asyncio.sleep(PURGE_BATCH_PAUSE)
+    if total:
+        logger.info(f"Окончательно удалено записей: {total}")
+
+
+async def _purge_loop(application) -> None:
+    while True:
+        try:
+            await run_purge_cycle(application)
+        except Exception as e:
+            logger.error(f"Ошибка при очистке удалённых записей: {e}")
+        await asyncio.sleep(PURGE_INTERVAL)
+
+
+async def start_purge(application, shard: int = 0, shards: int = 1) -> None:
+    if shard != 0:
+        return
+    start_background_task(_purge_loop(application), "purge-deleted")
@@ -0,0 +1,192 @@
+import logging
+import os
+from urllib.parse import quote
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from cache import TTLCache
+from database import get_user
+from resilience import UpstreamResponse, UpstreamUnavailable, fetch_json_async
+
+logger = logging.getLogger(__name__)
+
+WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
+WEATHER_GEOHASH_PRECISION = int(os.getenv('WEATHER_GEOHASH_PRECISION', '5'))
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '600'))
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', '10000'))
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+weather_by_geohash = TTLCache(WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL)
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    bits = 0
+    bit_count = 0
+    even = True
+    geohash = []
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def geohash_center(geohash: str):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def normalize_city(city: str) -> str:
+    return " ".join(city.lower().replace("ё", "е").split())
+
+
+async def fetch_weather(city: str, api_key: str) -> UpstreamResponse:
+    url = f"{WEATHER_API_URL}?q={quote(city)}&appid={api_key}&units=metric&lang=ru"
+    return await fetch_json_async(url, f"weather:{normalize_city(city)}")
+
+
+async def fetch_weather_by_location(latitude: float, longitude: float, api_key: str) -> UpstreamResponse:
+    """Fetch weather for the geohash cell containing the point.
+
+    Everyone inside one cell (about 5x5 km at the default precision) gets the
+    same cached response, fetched for the cell center.
+    """
+    geohash = geohash_encode(latitude, longitude, WEATHER_GEOHASH_PRECISION)
+    cached = weather_by_geohash.get(geohash)
+    if cached is not None:
+        return cached
+
+    center_latitude, center_longitude = geohash_center(geohash)
+    url = (
+        f"{WEATHER_API_URL}?lat={center_latitude:.4f}&lon={center_longitude:.4f}"
+        f"&appid={api_key}&units=metric&lang=ru"
+    )
+    response = await fetch_json_async(url, f"weather:geo:{geohash}")
+    if response.status_code == 200 and not response.stale:
+        weather_by_geohash.set(geohash, response)
+    return response
+
+
+def format_weather(data: dict) -> str:
+    return (
+        f"🌤 Погода в {data['name']}:\n\n"
+        f"🌡 Температура: {data['main']['temp']}°C\n"
+        f"💨 Ветер: {data['wind']['speed']} м/с\n"
+        f"💧 Влажность: {data['main']['humidity']}%\n"
+        f"📝 {data['weather'][0]['description'].capitalize()}"
+    )
+
+
+async def handle_weather(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        api_key = os.getenv('WEATHER_API_KEY')
+        if not api_key:
+            logger.error("WEATHER_API_KEY не найден в переменных окружения")
+            await update.message.reply_text("❌ Ошибка конфигурации. Пожалуйста, свяжитесь с администратором.")
+            return
+
+        city = " ".join(context.args) if context.args else "Pskov"
+        try:
+            response = await fetch_weather(city, api_key)
+        except UpstreamUnavailable:
+            response = None
+        data = response.data if response else {}
+
+        if response is None:
+            message = "❌ Сервис погоды временно недоступен. Попробуйте позже."
+        elif response.status_code != 200:
+            error_message = data.get('message', 'Неизвестная ошибка')
+            logger.error(f"Ошибка при получении погоды: {error_message}")
+            
+            if "city not found" in error_message.lower():
+                message = (
+                    "❌ Город не найден. Проверьте правильность написания.\n"
+                    "Пример: /weather Москва"
+                )
+            else:
+                message = "❌ Не удалось получить данные о погоде. Попробуйте позже."
+        else:
+            message = (
+                f"{format_weather(data)}\n\n"
+                f"Чтобы узнать погоду в другом городе, используйте команду:\n"
+                f"/weather <название города>\n"
+                f"или отправь геопозицию 📍"
+                f"{response.stale_note()}"
+            )
+
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        if update.callback_query:
+            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(message, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка в handle_weather: {e}")
+        if update.callback_query:
+            await update.callback_query.message.edit_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+        else:
+            await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        user = get_user(update.effective_user.id)
+        if not user:
+            await update.message.reply_text("❌ Сначала начни использовать бота командой /start")
+            return
+
+        api_key = os.getenv('WEATHER_API_KEY')
+        if not api_key:
+            logger.error("WEATHER_API_KEY не найден в переменных окружения")
+            await update.message.reply_text("❌ Ошибка конфигурации. Пожалуйста, свяжитесь с администратором.")
+            return
+
+        location = update.message.location
+        try:
+            response = await fetch_weather_by_location(location.latitude, location.longitude, api_key)
+        except UpstreamUnavailable:
+            response = None
+
+        if response is None:
+            message = "❌ Сервис погоды временно недоступен. Попробуйте позже."
+        elif response.status_code != 200:
+            logger.error(f"Ошибка при получении погоды: {response.data.get('message', 'Неизвестная ошибка')}")
+            message = "❌ Не удалось получить данные о погоде. Попробуйте позже."
+        else:
+            message = f"📍 {format_weather(response.data)}{response.stale_note()}"
+
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]]
+        await update.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    except Exception as e:
+        logger.error(f"Ошибка в handle_location: {e}")
+        await update.message.reply_text("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")